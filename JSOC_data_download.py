@@ -1,46 +1,432 @@
 from sunpy.net import Fido, attrs as a
 from astropy import units as u
+from astropy.time import Time
+import os, json, time, pickle, hashlib, argparse, warnings, queue, threading
+from concurrent.futures import ProcessPoolExecutor
+try:
+    from .correct_suvi_header import fits_complete
+except ImportError:  # imported as a top-level module
+    from correct_suvi_header import fits_complete
 
-# print(a.jsoc.Series) ## Prints all the available attributes 
+# print(a.jsoc.Series) ## Prints all the available attributes
 ## the names of the various data series
 #
 # print(a.Instrument) ## Names of all the instrument available
-# 
+#
+
+MANIFEST_NAME = '.jsoc_manifest.json' ## Kept in the download directory
+SEARCH_PREFIX = '.jsoc_search_' ## Saved search results, kept next to the manifest
+_FITS_SUFFIXES = ('.fits', '.fts', '.fit', '.fits.gz', '.fts.gz', '.fz')
+
+
+def _query_key(start, end, series, wavelength):
+    return f"{start}|{end}|{series}|{wavelength}"
+
+
+def _sha256(filepath, blocksize=1 << 20):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _search_name(key):
+    return SEARCH_PREFIX + hashlib.sha1(key.encode()).hexdigest()[:16] + '.pkl'
+
+
+def save_search(result, filepath):
+    """
+    Pickle a search result atomically, so a resumed download can fetch it without a new search.
+    """
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(result, f)
+    os.replace(tmp_path, filepath)
+
+
+def load_search(filepath):
+    with open(filepath, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_manifest(manifest_path):
+    """
+    Read a download manifest, or return an empty one if it does not exist.
+    """
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+    return {'queries': {}, 'files': {}}
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Write the manifest atomically, so an interrupted run never leaves it half written.
+    """
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def verify_file(filepath, entry):
+    """
+    Check a downloaded file against its manifest entry (size, and sha256 if recorded).
+    """
+    if not os.path.isfile(filepath) or os.path.getsize(filepath) != entry['size']:
+        return False
+    if entry.get('sha256') is not None:
+        return _sha256(filepath) == entry['sha256']
+    return True
+
+
+def record_files(manifest, filepaths, checksum=False):
+    """
+    Add downloaded files to the manifest with their size (and sha256).
+    """
+    for filepath in filepaths:
+        filepath = os.path.abspath(str(filepath))
+        manifest['files'][filepath] = {
+            'size': os.path.getsize(filepath),
+            'sha256': _sha256(filepath) if checksum else None,
+        }
+
+
+def jsoc_search(start, end, series='aia.lev1_uv_24s', wavelength=None, email=None,
+                client=Fido):
+    """
+    Search JSOC for a series between two times.
+
+    start, end: Time range of observation, e.g. '2021-10-28T15:30:25'
+    series: The specific data series to be searched. You will find the list in (a.jsoc.Series)
+    wavelength: Wavelength of observation (Quantity, or number in Angstrom). Optional.
+    email: The account used to fetch the data (a.jsoc.Notify). Required by JSOC exports.
+    client: Object with Fido's search/fetch interface. Default: sunpy.net.Fido
+    """
+    attrs = [a.Time(start, end), a.jsoc.Series(series)]
+    if wavelength is not None:
+        if not isinstance(wavelength, u.Quantity):
+            wavelength = wavelength * u.angstrom
+        attrs.append(a.Wavelength(wavelength))
+    if email is not None:
+        attrs.append(a.jsoc.Notify(email))
+    return client.search(*attrs)
+
+
+def fetch_with_retries(result, path, max_retries=5, backoff=2.0, max_conn=5,
+                       client=Fido, on_attempt=None):
+    """
+    Fetch search results, retrying only the failed files a bounded number of times.
+
+    result: Search result (or a previous fetch result with errors) to download.
+    path: Download directory.
+    max_retries: Maximum number of retries after the first attempt. Default: 5
+    backoff: Seconds to wait before the first retry; doubled on every retry. Default: 2.0
+    max_conn: Number of parallel connections. Default: 5
+    on_attempt: Optional callable, called with the result of every fetch attempt
+        (e.g. to record the files finished so far).
+
+    Returns the last fetch result; its .errors lists the files that still failed.
+    """
+    download = client.fetch(result, path=path, max_conn=max_conn)
+    if on_attempt is not None:
+        on_attempt(download)
+    attempt = 0
+    while len(download.errors) > 0 and attempt < max_retries:
+        time.sleep(backoff * 2**attempt)
+        attempt += 1
+        # Refetching a result with errors only retries the failed files
+        download = client.fetch(download, path=path, max_conn=max_conn)
+        if on_attempt is not None:
+            on_attempt(download)
+    if len(download.errors) > 0:
+        warnings.warn(f"{len(download.errors)} file(s) failed after {max_retries} retries.")
+    return download
+
+
+def download_jsoc(start, end, series='aia.lev1_uv_24s', wavelength=None, email=None,
+                  path='.', max_retries=5, backoff=2.0, max_conn=5, checksum=False,
+                  client=Fido):
+    """
+    Search and download a JSOC time range, resumably.
+
+    A manifest in the download directory records every downloaded file
+    (size, optionally sha256) and every query. Re-running a completed query
+    only verifies the files on disk and returns them, with no new search.
+
+    The search result is saved next to the manifest (SEARCH_PREFIX) before
+    anything is fetched, together with the names already in ``path``, and
+    an interrupted query is resumed from it without searching again. Files
+    are fetched straight into ``path``, where Fido skips the files already
+    there, and recorded after every fetch attempt. Fido reports files only
+    at the end of an attempt, so when a query is resumed, the FITS files
+    the interrupted run left in ``path`` are checked with fits_complete:
+    whole ones are recorded and kept, truncated ones deleted and fetched
+    again. Files on record that fail verification are deleted and
+    downloaded again.
+
+    start, end: Time range of observation
+    series: JSOC data series. Default: 'aia.lev1_uv_24s'
+    wavelength: Wavelength of observation (Quantity, or number in Angstrom). Optional.
+    email: JSOC notification address
+    path: Download directory. Default: current directory
+    max_retries, backoff, max_conn: See fetch_with_retries
+    checksum: Record and verify sha256 checksums as well as sizes. Default: False
+    client: Object with Fido's search/fetch interface. Default: sunpy.net.Fido
+
+    Returns the list of downloaded file paths.
+    """
+    os.makedirs(path, exist_ok=True)
+    path = os.path.abspath(path)
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    key = _query_key(start, end, series, wavelength)
+    query = manifest['queries'].get(key)
+
+    # Drop files that are on record but no longer verify
+    for filepath, entry in list(manifest['files'].items()):
+        if os.path.dirname(filepath) == path and not verify_file(filepath, entry):
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            del manifest['files'][filepath]
+
+    if query is not None and query['complete'] and all(f in manifest['files'] for f in query['files']):
+        return query['files']
+
+    if query is None or not os.path.exists(os.path.join(path, query.get('search', ''))):
+        res = jsoc_search(start, end, series=series, wavelength=wavelength, email=email,
+                          client=client)
+        query = {'complete': False, 'files': [], 'search': _search_name(key),
+                 'existing': sorted(os.listdir(path))}
+        save_search(res, os.path.join(path, query['search']))
+    else:
+        res = load_search(os.path.join(path, query['search']))
+        # Keep the whole files left by the interrupted fetch, delete the truncated ones
+        existing = set(query.get('existing', ()))
+        kept = []
+        for name in sorted(os.listdir(path)):
+            filepath = os.path.join(path, name)
+            if (name in existing or filepath in manifest['files'] or not name.endswith(_FITS_SUFFIXES)
+                    or not os.path.isfile(filepath)):
+                continue
+            if fits_complete(filepath):
+                kept.append(filepath)
+            else:
+                os.remove(filepath)
+        record_files(manifest, kept, checksum=checksum)
+        query['files'] = [f for f in query['files'] if f in manifest['files']]
+        query['files'] += [f for f in kept if f not in query['files']]
+    query['complete'] = False
+    manifest['queries'][key] = query
+    save_manifest(manifest, manifest_path)
+
+    files = query['files']
+    seen = set(files)
+
+    def record_attempt(download):
+        finished = []
+        for f in download:
+            filepath = os.path.abspath(str(f))
+            if filepath in seen:
+                continue
+            seen.add(filepath)
+            files.append(filepath)
+            if filepath not in manifest['files']:
+                finished.append(filepath)
+        record_files(manifest, finished, checksum=checksum)
+        save_manifest(manifest, manifest_path)
+
+    download = fetch_with_retries(res, path, max_retries=max_retries, backoff=backoff,
+                                  max_conn=max_conn, client=client, on_attempt=record_attempt)
+
+    query['complete'] = len(download.errors) == 0
+    save_manifest(manifest, manifest_path)
+    return files
+
+
+def plan_time_chunks(start, end, cadence, frames_per_chunk=100):
+    """
+    Split a long time range into consecutive search chunks.
+
+    start, end: Time range of observation
+    cadence: Observation cadence (Quantity, or number in seconds), e.g. 24 s
+    frames_per_chunk: Approximate number of frames per chunk. Default: 100
+
+    Returns a list of (start, end) ISO strings covering the range. a.Time is
+    inclusive at both ends, so every chunk but the last stops 1 ms short of
+    the next one to avoid fetching a boundary frame twice.
+    """
+    if not isinstance(cadence, u.Quantity):
+        cadence = cadence * u.s
+    start, end = Time(start), Time(end)
+    step = (cadence * frames_per_chunk).to(u.s)
+    chunks = []
+    t0 = start
+    while t0 < end:
+        t1 = min(t0 + step, end)
+        chunks.append((t0.isot, (t1 if t1 >= end else t1 - 1*u.ms).isot))
+        t0 = t1
+    return chunks
+
+
+_DONE = object() ## Queue sentinel
+_QUEUE_POLL = 0.1 ## Seconds between checks of the stop event while a queue is full or empty
+
+
+def _put(q, item, stop):
+    """
+    Put item on a bounded queue unless stop is set first. Returns whether it was put.
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_QUEUE_POLL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    """
+    Next item of a queue, or _DONE once stop is set.
+    """
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_QUEUE_POLL)
+        except queue.Empty:
+            pass
+    return _DONE
 
-time = a.Time('2021-10-28T15:30:25','2021-10-28T16:00:25') # Time of observation
-wv = a.Wavelength(1600*u.angstrom) # Wavelength of observation
-ser = a.jsoc.Series('aia.lev1_uv_24s') # The specific data series to be searched.
-## You will find the list in (a.jsoc.Series)
-notify_flag = a.jsoc.Notify('soumyaroy@iucaa.in') ## The account used to fetch the data
 
-fdir = '/Users/soumyaroy/Downloads/' ## Path where the data needs to be downloaded
+def pipelined_download(start, end, cadence, process, series='aia.lev1_uv_24s',
+                       wavelength=None, email=None, path='.', frames_per_chunk=100,
+                       queue_size=2, process_workers=1, delete_raw=True,
+                       max_retries=5, backoff=2.0, max_conn=5, client=Fido):
+    """
+    Search, download and process a long time range as overlapping stages.
 
-res = Fido.search(time, ser, wv, notify_flag) ## Compiles the list of files
+    The range is split with plan_time_chunks. One thread searches chunk by
+    chunk, a second fetches each chunk with fetch_with_retries, and the
+    downloaded files are handed to ``process`` while the next chunk is
+    still downloading. The stages are linked by bounded queues, so at most
+    ``queue_size`` searched chunks and ``queue_size`` chunks of files wait at
+    any time; with delete_raw the raw files are removed once processed and
+    disk use stays bounded. Files whose processing failed are kept.
 
-# print(res) ## Prints the details of the files found
+    cadence, frames_per_chunk: See plan_time_chunks
+    process: Callable taking a downloaded file path, e.g. a wrapper around
+        sun_register or suvi_restore_dn. Must be picklable if process_workers > 1.
+    queue_size: Maximum number of chunks waiting between stages. Default: 2
+    process_workers: Number of processes running ``process``. Default: 1 (this thread)
+    delete_raw: Delete every raw file after it has been processed successfully. Default: True
+    Other parameters: See download_jsoc
 
+    Returns a tuple (results, failures): results is a list of (path, return value)
+    in processing order, failures a dict of path → exception, including files
+    that failed to download.
+    """
+    os.makedirs(path, exist_ok=True)
+    chunks = plan_time_chunks(start, end, cadence, frames_per_chunk)
+    search_q = queue.Queue(maxsize=queue_size)
+    file_q = queue.Queue(maxsize=queue_size)
+    stage_errors = []
+    failures = {}
+    # Set when the main thread stops consuming (done, error or KeyboardInterrupt),
+    # so that stage threads blocked on a full or empty queue return
+    stop = threading.Event()
 
-########### Download the data ####################
+    def search_stage():
+        try:
+            for t0, t1 in chunks:
+                res = jsoc_search(t0, t1, series=series, wavelength=wavelength,
+                                  email=email, client=client)
+                if not _put(search_q, res, stop):
+                    break
+        except Exception as e:
+            stage_errors.append(e)
+        finally:
+            _put(search_q, _DONE, stop)
 
+    def fetch_stage():
+        try:
+            while (res := _get(search_q, stop)) is not _DONE:
+                download = fetch_with_retries(res, path, max_retries=max_retries,
+                                              backoff=backoff, max_conn=max_conn,
+                                              client=client)
+                for err in download.errors:
+                    failures[str(getattr(err, 'url', err))] = getattr(err, 'exception', err)
+                if not _put(file_q, [str(f) for f in download], stop):
+                    break
+        except Exception as e:
+            stage_errors.append(e)
+            # Unblock the search thread if it is waiting on a full queue
+            while _get(search_q, stop) is not _DONE:
+                pass
+        finally:
+            _put(file_q, _DONE, stop)
 
-download = Fido.fetch(res,path=fdir,)
+    threads = [threading.Thread(target=search_stage, daemon=True),
+               threading.Thread(target=fetch_stage, daemon=True)]
+    for thread in threads:
+        thread.start()
 
-## $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ ##
+    results = []
 
+    def finish(filepath, result=None, error=None):
+        if error is not None:
+            # Keep the raw file, so the frame can be retried without a new download
+            failures[filepath] = error
+            return
+        results.append((filepath, result))
+        if delete_raw and os.path.exists(filepath):
+            os.remove(filepath)
 
-while(len(download.errors)>0):
-    download = Fido.fetch(download,path=fdir,)
+    pool = ProcessPoolExecutor(max_workers=process_workers) if process_workers > 1 else None
+    try:
+        while (files := file_q.get()) is not _DONE:
+            if pool is None:
+                for filepath in files:
+                    try:
+                        finish(filepath, process(filepath))
+                    except Exception as e:
+                        finish(filepath, error=e)
+                continue
+            futures = [(f, pool.submit(process, f)) for f in files]
+            for filepath, future in futures:
+                try:
+                    finish(filepath, future.result())
+                except Exception as e:
+                    finish(filepath, error=e)
+    finally:
+        stop.set()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        for thread in threads:
+            thread.join()
 
-# CAUTION!!CAUTION!! 
-# 
-# This step is only useful if there are errors in the download
-# e.g. partial files or full error and you want to restart the  
-# download immidiately. There is a slight chance that you are 
-# stuck in an infinite loop and have to kill the kernel!!
-# 
-# I should really add a break counter !!
+    if stage_errors:
+        raise stage_errors[0]
+    return results, failures
 
-## $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ ##
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download a JSOC time range with bounded retries.")
+    parser.add_argument('start', help="Start time, e.g. 2021-10-28T15:30:25")
+    parser.add_argument('end', help="End time, e.g. 2021-10-28T16:00:25")
+    parser.add_argument('--series', default='aia.lev1_uv_24s')
+    parser.add_argument('--wavelength', type=float, default=None, help="Wavelength in Angstrom")
+    parser.add_argument('--email', default=None, help="JSOC notification address")
+    parser.add_argument('--path', default='.', help="Download directory")
+    parser.add_argument('--max-retries', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=2.0)
+    parser.add_argument('--max-conn', type=int, default=5)
+    parser.add_argument('--checksum', action='store_true', help="Record and verify sha256 checksums")
+    args = parser.parse_args()
 
-###################################################
\ No newline at end of file
+    files = download_jsoc(
+        args.start, args.end, series=args.series, wavelength=args.wavelength,
+        email=args.email, path=args.path, max_retries=args.max_retries,
+        backoff=args.backoff, max_conn=args.max_conn, checksum=args.checksum
+    )
+    print(f"{len(files)} file(s) in {args.path}")
@@ -0,0 +1,45 @@
+import importlib
+
+# Public API, loaded lazily: importing the package is cheap, and a submodule
+# (with its dependencies: sunpy, matplotlib, asdf, ...) is only imported the
+# first time one of its names is used. Note that ``suvi_restore_dn`` is the
+# submodule; the function of that name is suvi_restore_dn.suvi_restore_dn.
+_EXPORTS = {
+    'correct_suvi_header': ('fix_suvi_l1b_header', 'read_suvi_l1b'),
+    'suvi_restore_dn': ('SuviIndex', 'suvi_index_from_map', 'suvi_approx_response',
+                        'suvi_response_cached', 'suvi_restore_dn_batch'),
+    'header_catalog': ('HeaderCatalog',),
+    'suvi_pipeline': ('run_suvi_pipeline',),
+    'JSOC_data_download': ('jsoc_search', 'fetch_with_retries', 'download_jsoc',
+                           'plan_time_chunks', 'pipelined_download'),
+    'read_save_map': ('save_asdf_map', 'read_asdf_map', 'read_asdf_cube', 'read_asdf_roi',
+                      'AsdfMapWriter', 'LazyMapSequence'),
+    'register': ('sun_register', 'sun_register_sequence'),
+    'register_cache': ('RegistrationCache',),
+    'coalign': ('coalign_sequence', 'shift_maps'),
+    'wcs_submap': ('apply_mask_to_submap', 'TrackedRegion', 'track_region'),
+    'region_stats': ('RegionStats', 'region_light_curves'),
+    'template_selection_box': ('select_roi_with_mouse', 'preview_map', 'save_roi', 'load_roi',
+                               'apply_saved_roi'),
+    'suvi_stack': ('BinnedStacker', 'SlidingStacker', 'StackedFrame', 'stack_restored_batch'),
+    'instrument': ('profiling',),
+}
+
+_NAME_TO_MODULE = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_NAME_TO_MODULE)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return importlib.import_module(f'.{name}', __name__)
+    if name in _NAME_TO_MODULE:
+        module = importlib.import_module(f'.{_NAME_TO_MODULE[name]}', __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_EXPORTS))
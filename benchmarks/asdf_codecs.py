@@ -0,0 +1,87 @@
+"""
+Write/read throughput and compression ratio of the ASDF storage options.
+
+Run from the directory that contains the package, e.g.
+
+    python -m solar_codes.benchmarks.asdf_codecs --sizes 1280 4096
+
+Frames are synthetic full-disk images in integer DN (SUVI is 1280², AIA
+4096²), so every codec is measured with and without the integer path and
+with and without tiling. No network access is needed.
+"""
+import os, time, json, argparse, tempfile, itertools
+
+import numpy as np
+
+from ..read_save_map import save_asdf_map, read_asdf_map, read_asdf_roi, COMPRESSION_CODECS
+from .synthetic import synthetic_disk_map
+
+
+def _time(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes=(1280, 4096), codecs=(None,) + COMPRESSION_CODECS, tile=512, roi=256,
+        repeat=3, workdir=None):
+    """
+    Time every storage option on synthetic frames of the given sizes.
+
+    Returns a list of result dicts (one per size/codec/integer/tiling).
+    """
+    results = []
+    unavailable = set()
+    workdir = workdir or tempfile.mkdtemp(prefix="asdf_codecs_")
+    for size in sizes:
+        smap = synthetic_disk_map(size)
+        raw_mb = smap.data.nbytes / 1e6
+        x0 = y0 = size // 2 - roi // 2
+        for codec, integer, tiled in itertools.product(codecs, (False, True), (False, True)):
+            if codec in unavailable:
+                continue
+            tile_shape = (tile, tile) if tiled else None
+            filepath = os.path.join(workdir, f"bench_{size}.asdf")
+            try:
+                t_write = _time(lambda: save_asdf_map(
+                    smap, filename=filepath, compress=codec or False,
+                    integer=integer, tile_shape=tile_shape), repeat)
+            except ImportError as e:
+                print(f"Skipping {codec}: {e}")
+                unavailable.add(codec)
+                continue
+            t_read = _time(lambda: read_asdf_map(filepath), repeat)
+            t_roi = _time(lambda: read_asdf_roi(filepath, (x0, x0 + roi), (y0, y0 + roi)), repeat)
+            result = {
+                "size": size, "codec": codec or "none", "integer": integer,
+                "tile": tile if tiled else None,
+                "write_MB_s": raw_mb / t_write, "read_MB_s": raw_mb / t_read,
+                "roi_read_ms": 1e3 * t_roi,
+                "ratio": smap.data.nbytes / os.path.getsize(filepath),
+            }
+            results.append(result)
+            print(f"{size:5d} {result['codec']:5s} int={integer!s:5s} tile={result['tile']!s:4s} "
+                  f"write {result['write_MB_s']:8.1f} MB/s  read {result['read_MB_s']:8.1f} MB/s  "
+                  f"ROI {result['roi_read_ms']:8.2f} ms  ratio {result['ratio']:5.2f}")
+            os.remove(filepath)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1280, 4096])
+    parser.add_argument("--codecs", nargs="+", default=["none"] + list(COMPRESSION_CODECS))
+    parser.add_argument("--tile", type=int, default=512)
+    parser.add_argument("--roi", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    codecs = [None if c == "none" else c for c in args.codecs]
+    results = run(args.sizes, codecs, tile=args.tile, roi=args.roi, repeat=args.repeat)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
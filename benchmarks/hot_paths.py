@@ -0,0 +1,269 @@
+"""
+Wall time and peak memory of the hot paths of every module, on synthetic data.
+
+Run from the directory that contains the package, e.g.
+
+    python -m solar_codes.benchmarks.hot_paths --sizes 1280 4096 --json run.json
+    python -m solar_codes.benchmarks.hot_paths --compare old.json run.json
+
+Every benchmark runs across image sizes and, where it processes several
+frames, batch sizes. Inputs are written by benchmarks.synthetic (SUVI L1b
+FITS with CONTINUE cards, AIA-like full-disk maps), so no network access
+is needed. Peak memory is the tracemalloc peak of one extra run, which
+covers numpy allocations but not memory-mapped file pages.
+"""
+import os, sys, time, json, argparse, tempfile, platform, tracemalloc, warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import astropy
+import astropy.units as u
+import sunpy
+
+from ..correct_suvi_header import fix_suvi_l1b_header, read_suvi_l1b
+from ..suvi_restore_dn import suvi_index_from_map, suvi_restore_dn, suvi_restore_dn_batch
+from ..register import sun_register, sun_register_sequence
+from ..wcs_submap import apply_mask_to_submap, clear_mask_cache
+from ..region_stats import RegionStats
+from ..coalign import coalign_sequence
+from ..read_save_map import save_asdf_map, read_asdf_map
+from ..header_catalog import HeaderCatalog
+from ..suvi_stack import BinnedStacker, stack_restored_batch
+from .synthetic import synthetic_sequence, write_synthetic_suvi
+
+
+# --- Benchmarks ---
+# Each takes (size, batch, workdir), does its setup and returns the
+# zero-argument callable that is timed, and the number of frames it handles.
+
+def bench_fix_header(size, batch, workdir):
+    paths = [write_synthetic_suvi(os.path.join(workdir, f"hdr_{size}_{i}.fits"), size, seed=i)
+             for i in range(batch)]
+    return lambda: [fix_suvi_l1b_header(p) for p in paths], batch
+
+
+def bench_read_suvi(size, batch, workdir):
+    paths = [write_synthetic_suvi(os.path.join(workdir, f"read_{size}_{i}.fits.gz"), size, seed=i, gz=True)
+             for i in range(batch)]
+    return lambda: [np.asarray(read_suvi_l1b(p).data).sum() for p in paths], batch
+
+
+def bench_restore_dn(size, batch, workdir):
+    path = write_synthetic_suvi(os.path.join(workdir, f"restore_{size}.fits"), size)
+    suvi_map = read_suvi_l1b(path)
+    data, index = np.array(suvi_map.data), suvi_index_from_map(suvi_map)
+    if batch == 1:
+        return lambda: suvi_restore_dn(data, index, dtype=np.float32), 1
+    cube = np.broadcast_to(data, (batch,) + data.shape)
+    indices = [index] * batch
+    return lambda: suvi_restore_dn_batch(cube, indices, dtype=np.float32, chunk_rows=256), batch
+
+
+def bench_stack(size, batch, workdir):
+    path = write_synthetic_suvi(os.path.join(workdir, f"stack_{size}.fits"), size)
+    suvi_map = read_suvi_l1b(path)
+    data, index = np.array(suvi_map.data), suvi_index_from_map(suvi_map)
+    cube = np.broadcast_to(data, (batch,) + data.shape)
+    indices = [index] * batch
+    times = np.arange(batch) * 4.0
+    return lambda: stack_restored_batch(cube, indices, times, BinnedStacker(data.shape, 16.0),
+                                        frames_per_batch=4, dtype=np.float32), batch
+
+
+def bench_register(size, batch, workdir):
+    maps = synthetic_sequence(size, batch)
+    res = maps[0].scale[0] * 1.2
+    if batch == 1:
+        return lambda: sun_register(maps[0], res=res), 1
+    return lambda: sun_register_sequence(maps, res=res), batch
+
+
+def bench_register_window(size, batch, workdir):
+    maps = synthetic_sequence(size, batch)
+    res = maps[0].scale[0] * 1.2
+    window = ([size // 3, size // 3] * u.pix, [size // 3 + size // 8, size // 3 + size // 8] * u.pix)
+    return lambda: [sun_register(m, res=res, window=window) for m in maps], batch
+
+
+def _region(smap, fraction=0.1):
+    centre = smap.center
+    half = fraction * smap.data.shape[0] * smap.scale[0] * u.pix / 2
+    return ((centre.Tx - half).to(u.arcsec), (centre.Ty - half).to(u.arcsec),
+            (centre.Tx + half).to(u.arcsec), (centre.Ty + half).to(u.arcsec))
+
+
+def bench_mask(size, batch, workdir):
+    from astropy.coordinates import SkyCoord
+    maps = synthetic_sequence(size, batch)
+    x0, y0, x1, y1 = _region(maps[0])
+    frame = maps[0].coordinate_frame
+    bl, tr = SkyCoord(x0, y0, frame=frame), SkyCoord(x1, y1, frame=frame)
+
+    def run():
+        clear_mask_cache()
+        return [apply_mask_to_submap(m, bl, top_right=tr, crop=True) for m in maps]
+    return run, batch
+
+
+def bench_region_stats(size, batch, workdir, n_regions=100):
+    from astropy.coordinates import SkyCoord
+    maps = synthetic_sequence(size, batch)
+    frame = maps[0].coordinate_frame
+    rng = np.random.default_rng(0)
+    half = size * maps[0].scale[0].to_value(u.arcsec / u.pix) / 3
+    regions = []
+    for x, y in rng.uniform(-half, half, (n_regions, 2)):
+        regions.append((SkyCoord(x * u.arcsec, y * u.arcsec, frame=frame),
+                        SkyCoord((x + half / 10) * u.arcsec, (y + half / 10) * u.arcsec, frame=frame)))
+    return lambda: RegionStats(regions).run(maps), batch
+
+
+def bench_coalign(size, batch, workdir):
+    maps = synthetic_sequence(size, batch, jitter=1.0)
+    n = size // 8
+    template = maps[0].submap([size // 2 - n, size // 2 - n] * u.pix,
+                              top_right=[size // 2 + n, size // 2 + n] * u.pix)
+    return lambda: coalign_sequence(maps, template, search=10), batch
+
+
+def bench_asdf_roundtrip(size, batch, workdir):
+    import sunpy.map
+    maps = synthetic_sequence(size, batch)
+    obj = maps[0] if batch == 1 else sunpy.map.MapSequence(maps)
+    filepath = os.path.join(workdir, f"roundtrip_{size}_{batch}.asdf")
+
+    def run():
+        save_asdf_map(obj, filename=filepath, layout="auto")
+        return read_asdf_map(filepath)
+    return run, batch
+
+
+def bench_catalog(size, batch, workdir):
+    root = os.path.join(workdir, f"catalog_{size}_{batch}")
+    os.makedirs(root, exist_ok=True)
+    for i in range(batch):
+        write_synthetic_suvi(os.path.join(root, f"frame_{i}.fits"), size, seed=i)
+    db_path = os.path.join(workdir, f"catalog_{size}_{batch}.sqlite")
+
+    def run():
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        with HeaderCatalog(db_path) as catalog:
+            return catalog.update(root, workers=1)
+    return run, batch
+
+
+BENCHMARKS = {
+    'fix_header': bench_fix_header,
+    'read_suvi': bench_read_suvi,
+    'restore_dn': bench_restore_dn,
+    'stack': bench_stack,
+    'register': bench_register,
+    'register_window': bench_register_window,
+    'mask': bench_mask,
+    'region_stats': bench_region_stats,
+    'coalign': bench_coalign,
+    'asdf_roundtrip': bench_asdf_roundtrip,
+    'catalog': bench_catalog,
+}
+
+
+def _best_time(func, repeat):
+    func()  # warm-up: lazy imports and first-call caches
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def environment():
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'astropy': astropy.__version__,
+        'sunpy': sunpy.__version__,
+    }
+
+
+def run(names=None, sizes=(512, 1280), batches=(1, 8), repeat=3, workdir=None, memory=True):
+    """
+    Run the named benchmarks (default: all) over sizes x batches.
+
+    Returns a dict with the 'environment' and a list of 'results', one per
+    (benchmark, size, batch) with the best wall time in seconds, seconds per
+    frame and the tracemalloc peak in MB.
+    """
+    names = names or list(BENCHMARKS)
+    workdir = workdir or tempfile.mkdtemp(prefix="solar_codes_bench_")
+    results = []
+    for name in names:
+        for size in sizes:
+            for batch in batches:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    func, n_frames = BENCHMARKS[name](size, batch, workdir)
+                    seconds = _best_time(func, repeat)
+                    peak = _peak_memory(func) if memory else None
+                result = {
+                    'benchmark': name, 'size': size, 'batch': batch,
+                    'seconds': seconds, 'per_frame_s': seconds / n_frames,
+                    'peak_MB': peak / 1e6 if peak is not None else None,
+                }
+                results.append(result)
+                print(f"{name:16s} {size:5d} x{batch:<3d} {seconds:9.4f} s  "
+                      f"{result['per_frame_s']:9.4f} s/frame  "
+                      + (f"{result['peak_MB']:9.1f} MB" if memory else ""))
+    return {'environment': environment(), 'results': results}
+
+
+def compare(old, new):
+    """
+    Print the time and memory ratios new/old of two saved runs.
+    """
+    def keyed(report):
+        return {(r['benchmark'], r['size'], r['batch']): r for r in report['results']}
+
+    old, new = keyed(old), keyed(new)
+    for key in sorted(old.keys() & new.keys()):
+        o, n = old[key], new[key]
+        line = f"{key[0]:16s} {key[1]:5d} x{key[2]:<3d} time {n['seconds'] / o['seconds']:6.2f}x"
+        if o.get('peak_MB') and n.get('peak_MB'):
+            line += f"  memory {n['peak_MB'] / o['peak_MB']:6.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1280])
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run")
+    parser.add_argument("--json", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), default=None,
+                        help="Compare two saved runs instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            compare(json.load(f_old), json.load(f_new))
+    else:
+        report = run(args.only, args.sizes, args.batches, repeat=args.repeat,
+                     memory=not args.no_memory)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=1)
@@ -0,0 +1,67 @@
+"""
+Import time of the package entry points, each in a fresh interpreter.
+
+Run from the directory that contains the package, e.g.
+
+    python -m solar_codes.benchmarks.import_time --repeat 5 --json imports.json
+
+Compares importing the package alone and using one name from it (which
+loads only that name's submodule) with importing every submodule eagerly,
+as the package did before its API became lazy.
+"""
+import os, sys, json, argparse, subprocess, time
+
+PACKAGE = __package__.rsplit('.', 1)[0]
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_SUBMODULES = (
+    'correct_suvi_header', 'suvi_restore_dn', 'header_catalog', 'suvi_pipeline',
+    'JSOC_data_download', 'read_save_map', 'register', 'register_cache', 'coalign',
+    'wcs_submap', 'region_stats', 'template_selection_box', 'suvi_stack', 'instrument',
+)
+
+CASES = {
+    'package': f"import {PACKAGE}",
+    'suvi_restore_dn_batch': f"from {PACKAGE} import suvi_restore_dn_batch",
+    'fix_suvi_l1b_header': f"from {PACKAGE} import fix_suvi_l1b_header",
+    'sun_register': f"from {PACKAGE} import sun_register",
+    'save_asdf_map': f"from {PACKAGE} import save_asdf_map",
+    'eager_all': "; ".join(f"import {PACKAGE}.{m}" for m in _SUBMODULES),
+}
+
+
+def _time_import(statement):
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], cwd=_ROOT, check=True,
+                   env=dict(os.environ, MPLBACKEND="Agg"))
+    return time.perf_counter() - t0
+
+
+def run(cases=None, repeat=5):
+    """
+    Best-of-repeat wall time of every case, including interpreter start-up
+    (measured separately as 'python').
+    """
+    cases = cases or list(CASES)
+    statements = {'python': "pass"}
+    statements.update((name, CASES[name]) for name in cases)
+    for statement in statements.values():
+        _time_import(statement)  # warm the file system cache
+    results = {}
+    for name, statement in statements.items():
+        results[name] = min(_time_import(statement) for _ in range(repeat))
+        print(f"{name:24s} {results[name] * 1e3:8.1f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.cases, args.repeat)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
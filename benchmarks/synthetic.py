@@ -0,0 +1,161 @@
+"""
+Offline synthetic inputs for the benchmarks: AIA-like full-disk maps and
+SUVI L1b FITS files whose headers carry CONTINUE'd long-string keywords.
+"""
+import gzip
+
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import SkyCoord
+from astropy.time import Time, TimeDelta
+import sunpy.map
+from sunpy.coordinates import frames
+
+from ..correct_suvi_header import FITS_BLOCK, FITS_CARD
+
+T0 = '2021-10-28T15:30:00'
+
+
+def _disk_image(size, seed, rng=None):
+    """
+    Limb-brightened disk, exponential corona and Poisson noise, in DN.
+    """
+    rng = rng or np.random.default_rng(seed)
+    y, x = np.ogrid[:size, :size]
+    r = np.hypot(x - size / 2, y - size / 2) / (0.4 * size)
+    disk = np.where(r < 1, 300 + 200 * r**4, 300 * np.exp(-(r - 1) * 8))
+    return rng.poisson(disk).astype(np.float32)
+
+
+def synthetic_disk_map(size, seed=0, obstime=T0):
+    """
+    Full-disk EUV-like map in DN with an AIA-like WCS (0.6"/pix at 4096²).
+    """
+    data = _disk_image(size, seed)
+    ref = SkyCoord(0 * u.arcsec, 0 * u.arcsec, obstime=obstime,
+                   observer='earth', frame=frames.Helioprojective)
+    scale = 0.6 * 4096 / size
+    header = sunpy.map.make_fitswcs_header(
+        data, ref, scale=[scale, scale] * u.arcsec / u.pix,
+        wavelength=171 * u.angstrom, exposure=2 * u.s
+    )
+    return sunpy.map.Map(data, header)
+
+
+def synthetic_sequence(size, n_frames, cadence=12, seed=0, jitter=0.0):
+    """
+    List of synthetic_disk_map frames at a fixed cadence (seconds), with
+    optional random pointing jitter (pixels, applied to CRPIX).
+    """
+    rng = np.random.default_rng(seed)
+    maps = []
+    for i in range(n_frames):
+        obstime = (Time(T0) + TimeDelta(cadence * i, format='sec')).isot
+        smap = synthetic_disk_map(size, seed=seed + i, obstime=obstime)
+        if jitter:
+            smap.meta['crpix1'] += rng.normal(0, jitter)
+            smap.meta['crpix2'] += rng.normal(0, jitter)
+        maps.append(smap)
+    return maps
+
+
+def _card(key, value=None, comment=None):
+    """
+    One or more 80-character FITS cards. Strings longer than one card are
+    split into a '&'-terminated value and CONTINUE cards, as in SUVI files.
+    """
+    if value is None:
+        return [f"{key:<8s}{comment or '':72s}"[:FITS_CARD]]
+    if not isinstance(value, str):
+        if isinstance(value, bool):
+            text = 'T' if value else 'F'
+        else:
+            text = repr(value)
+        card = f"{key:<8s}= {text:>20s}"
+        if comment:
+            card += f" / {comment}"
+        return [card[:FITS_CARD].ljust(FITS_CARD)]
+
+    value = value.replace("'", "''")
+    first, rest = value[:67], value[67:]
+    if not rest:
+        card = f"{key:<8s}= '{first:<8s}'"
+        if comment:
+            card += f" / {comment}"
+        return [card[:FITS_CARD].ljust(FITS_CARD)]
+    cards = [f"{key:<8s}= '{first}&'".ljust(FITS_CARD)]
+    while len(rest) > 67:
+        cards.append(f"CONTINUE  '{rest[:67]}&'".ljust(FITS_CARD))
+        rest = rest[67:]
+    last = f"CONTINUE  '{rest}'"
+    if comment:
+        last += f" / {comment}"
+    cards.append(last[:FITS_CARD].ljust(FITS_CARD))
+    return cards
+
+
+def write_synthetic_suvi(path, size=1280, seed=0, wavelnth=171, filter1='Thin_Al',
+                         filter2='Open', ccd_tmp1=-60.1, date_obs='2021-10-28T15:30:25.123Z',
+                         gz=False):
+    """
+    Write a SUVI L1b-like FITS file: radiance data (float32) and a header
+    with the keywords used by the repo, several of them CONTINUE'd.
+    """
+    rng = np.random.default_rng(seed)
+    data = (_disk_image(size, seed, rng) * 1e-6).astype('>f4')
+    crpix = (size + 1) / 2
+    long_filename = (f"OR_SUVI-L1b-Fe{wavelnth:03d}_G16_s2021301153025{seed % 10}"
+                     f"_e20213011530261_c20213011530299_synthetic_benchmark_frame.fits")
+    cards = []
+    for args in [
+        ('SIMPLE', True, 'conforms to FITS standard'),
+        ('BITPIX', -32),
+        ('NAXIS', 2),
+        ('NAXIS1', size),
+        ('NAXIS2', size),
+        ('EXTEND', True),
+        ('LONGSTRN', 'OGIP 1.0', 'The OGIP long string convention may be used'),
+        ('TELESCOP', 'GOES-16'),
+        ('INSTRUME', 'GOES-R Series Solar Ultraviolet Imager'),
+        ('FILENAME', long_filename, 'file name'),
+        ('DATE-OBS', date_obs, 'sun observation start time'),
+        ('EXPTIME', 1.0, '[s] exposure time'),
+        ('WAVELNTH', wavelnth, '[angstrom] wavelength'),
+        ('WAVEUNIT', 'angstrom'),
+        ('FILTER1', filter1),
+        ('FILTER2', filter2),
+        ('CCD_TMP1', ccd_tmp1, '[degC] CCD temperature 1'),
+        ('CCD_TMP2', ccd_tmp1 + 0.2, '[degC] CCD temperature 2'),
+        ('WCSNAME', 'Helioprojective-cartesian'),
+        ('CTYPE1', 'HPLN-TAN'),
+        ('CTYPE2', 'HPLT-TAN'),
+        ('CUNIT1', 'arcsec'),
+        ('CUNIT2', 'arcsec'),
+        ('CRPIX1', crpix),
+        ('CRPIX2', crpix),
+        ('CRVAL1', 0.0),
+        ('CRVAL2', 0.0),
+        ('CDELT1', 2.5 * 1280 / size),
+        ('CDELT2', 2.5 * 1280 / size),
+        ('CROTA', 0.0),
+        ('DSUN_OBS', 1.48e11, '[m] distance to Sun'),
+        ('RSUN_OBS', 970.2, '[arcsec] solar radius'),
+        ('HGLN_OBS', 0.0),
+        ('HGLT_OBS', 4.5),
+        ('BUNIT', 'W m^-2 sr^-1'),
+        ('PROCESS', 'Synthetic level 1b frame written by the solar_codes benchmarks to '
+                    'exercise CONTINUE card handling in the header repair code path.'),
+    ]:
+        cards += _card(*args)
+    cards += _card('HISTORY', comment='synthetic benchmark file')
+    cards.append('END'.ljust(FITS_CARD))
+
+    header = ''.join(cards)
+    header += ' ' * (-len(header) % FITS_BLOCK)
+    raw = data.tobytes()
+    raw += b'\0' * (-len(raw) % FITS_BLOCK)
+    opener = gzip.open if gz else open
+    with opener(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(raw)
+    return path
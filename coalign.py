@@ -0,0 +1,184 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sunpy.map import Map, MapSequence
+from .instrument import instrument
+
+
+def _as_map(item):
+    return Map(item) if isinstance(item, (str, os.PathLike)) else item
+
+
+def _window_origin(smap, template):
+    """
+    Exact frame pixel of the template's first pixel, from the frame's WCS.
+    """
+    x, y = smap.wcs.world_to_pixel(template.wcs.pixel_to_world(0, 0))
+    return float(x), float(y)
+
+
+def _extract_window(data, x0, y0, shape):
+    """
+    Cut a (ny, nx) window with its first pixel at (x0, y0) out of data.
+
+    Parts outside the frame, and NaNs, are set to the window mean, so they
+    do not correlate with anything.
+    """
+    ny, nx = shape
+    window = np.full(shape, np.nan)
+    sy0, sy1 = max(y0, 0), min(y0 + ny, data.shape[0])
+    sx0, sx1 = max(x0, 0), min(x0 + nx, data.shape[1])
+    if sy1 > sy0 and sx1 > sx0:
+        window[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = data[sy0:sy1, sx0:sx1]
+    mean = np.nanmean(window) if np.isfinite(window).any() else 0.0
+    window -= mean
+    np.nan_to_num(window, copy=False, nan=0.0)
+    return window
+
+
+def template_fft(template, window_shape):
+    """
+    FFT of the zero-mean template, zero-padded to the search window shape.
+
+    Computed once and reused for every frame by coalign_sequence.
+    """
+    data = np.array(template.data, dtype=float)
+    data -= np.nanmean(data)
+    np.nan_to_num(data, copy=False, nan=0.0)
+    padded = np.zeros(window_shape)
+    padded[:data.shape[0], :data.shape[1]] = data
+    return np.conj(np.fft.rfft2(padded))
+
+
+def _parabolic_offset(c_minus, c_0, c_plus):
+    """
+    Sub-pixel offset of the vertex of a parabola through three samples.
+    """
+    denom = c_minus - 2 * c_0 + c_plus
+    if denom == 0 or not np.isfinite(denom):
+        return 0.0
+    return float(np.clip(0.5 * (c_minus - c_plus) / denom, -0.5, 0.5))
+
+
+def _peak(corr, max_lag_y, max_lag_x):
+    """
+    Integer peak of a correlation surface restricted to the valid lags,
+    refined with a parabola through its neighbours along each axis.
+    """
+    valid = corr[:2 * max_lag_y + 1, :2 * max_lag_x + 1]
+    py, px = np.unravel_index(np.argmax(valid), valid.shape)
+    dy = _parabolic_offset(*valid[py-1:py+2, px]) if 0 < py < valid.shape[0] - 1 else 0.0
+    dx = _parabolic_offset(*valid[py, px-1:px+2]) if 0 < px < valid.shape[1] - 1 else 0.0
+    return px + dx, py + dy, valid[py, px]
+
+
+def _align_batch(items, template, template_ft, window_shape, search):
+    """
+    Shifts of one batch of frames: the windows are stacked and transformed
+    with one batched rfft2/irfft2.
+    """
+    ny, nx = template.data.shape
+    windows, origins = [], []
+    for item in items:
+        smap = _as_map(item)
+        x_exact, y_exact = _window_origin(smap, template)
+        x0, y0 = int(round(x_exact)), int(round(y_exact))
+        windows.append(_extract_window(smap.data, x0 - search, y0 - search, window_shape))
+        origins.append((x0 - x_exact, y0 - y_exact))
+
+    spectra = np.fft.rfft2(np.stack(windows))
+    spectra *= template_ft
+    corr = np.fft.irfft2(spectra, s=window_shape)
+
+    shifts = np.empty((len(items), 2))
+    peaks = np.empty(len(items))
+    for i, (offset_x, offset_y) in enumerate(origins):
+        px, py, peaks[i] = _peak(corr[i], search, search)
+        shifts[i] = (px - search + offset_x, py - search + offset_y)
+    return shifts, peaks
+
+
+def shift_maps(maps, shifts, order=1, missing=np.nan, workers=None):
+    """
+    Shift the data of every map by -shift, undoing the measured jitter.
+
+    maps: MapSequence or iterable of maps / FITS paths
+    shifts: (N, 2) array of (dx, dy) pixel shifts, as from coalign_sequence
+    order: Spline order of the interpolation. Default: 1
+    missing: Value for pixels shifted in from outside. Default: NaN
+    workers: Number of threads. Default: os.cpu_count()
+
+    Returns a MapSequence in input order.
+    """
+    from scipy.ndimage import shift as nd_shift
+
+    def one(args):
+        item, (dx, dy) = args
+        smap = _as_map(item)
+        data = nd_shift(np.asarray(smap.data, dtype=float), (-dy, -dx), order=order,
+                        mode='constant', cval=missing)
+        return smap._new_instance(data, smap.meta.copy(), smap.plot_settings)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return MapSequence(list(pool.map(one, zip(maps, shifts))), sortby=None)
+
+
+@instrument('coalign')
+def coalign_sequence(maps, template, search=20, batch_size=32, workers=None,
+                     apply_shifts=False, order=1, missing=np.nan):
+    """
+    Measure the pointing jitter of a sequence by FFT cross-correlation with a template.
+
+    The template is a submap of a reference frame, e.g. from
+    template_selection_box.select_roi_with_mouse. In every frame the window
+    covering the template's field of view, enlarged by ``search`` pixels on
+    every side, is cross-correlated with the template. The template FFT is
+    computed once; frames are processed in batches with one stacked
+    rfft2/irfft2 per batch, and batches run in parallel threads. The
+    correlation peak is refined to sub-pixel precision with a parabolic fit.
+
+    Parameters
+    ----------
+    maps : MapSequence or iterable of maps / FITS paths
+        Frames to align; paths are read in the worker threads.
+    template : sunpy.map.GenericMap
+        Template submap.
+    search : int, optional
+        Largest shift searched for, in pixels. Default: 20
+    batch_size : int, optional
+        Number of frames transformed together. Default: 32
+    workers : int, optional
+        Number of threads. Default: os.cpu_count()
+    apply_shifts : bool, optional
+        Also return the frames shifted onto the template (see shift_maps).
+    order, missing : optional
+        Interpolation order and fill value of shift_maps.
+
+    Returns
+    -------
+    shifts : ndarray
+        (N, 2) array of (dx, dy) in pixels: where the template's features
+        are in each frame relative to their position in the frame's WCS.
+    peaks : ndarray
+        Correlation peak value of each frame, a rough quality measure.
+    aligned : MapSequence
+        Only with apply_shifts, the shifted frames.
+    """
+    items = list(maps)
+    window_shape = (template.data.shape[0] + 2 * search, template.data.shape[1] + 2 * search)
+    template_ft = template_fft(template, window_shape)
+
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        results = list(pool.map(
+            lambda batch: _align_batch(batch, template, template_ft, window_shape, search),
+            batches
+        ))
+
+    shifts = np.concatenate([s for s, _ in results]) if results else np.empty((0, 2))
+    peaks = np.concatenate([p for _, p in results]) if results else np.empty(0)
+
+    if not apply_shifts:
+        return shifts, peaks
+    return shifts, peaks, shift_maps(items, shifts, order=order, missing=missing, workers=workers)
@@ -1,103 +1,289 @@
 from astropy.io import fits
-import requests
-import os, gzip, re
-import glob
+import numpy as np
+import os, gzip
+try:
+    from .instrument import instrument
+except ImportError:  # imported as a top-level module
+    from instrument import instrument
 
-def fix_suvi_l1b_header(in_filename):
-    # Read the file manually as bytes until we hit a UnicodeDecodeError, i.e.
-    # until we reach the data part. Since astropy version 4.2.1, we can't use
-    # the .to_string() method anymore because of FITS header consistency checks
-    # that cannot be overridden. 
-    header = ''
+FITS_BLOCK = 2880
+FITS_CARD = 80
+_BLANK_CARD = " "*FITS_CARD
+_GZIP_MAGIC = b'\x1f\x8b'
+
+# FITS BITPIX → big-endian numpy dtype
+_BITPIX_DTYPES = {8: 'u1', 16: '>i2', 32: '>i4', 64: '>i8', -32: '>f4', -64: '>f8'}
+
+
+def _is_gzipped(in_filename):
     with open(in_filename, 'rb') as in_file:
-        counter = 1
-        while True:
-            try:
-                this_line = in_file.read(counter)
-                this_str = this_line.decode("utf-8")
-                header += this_str
-                counter += 1
-            except UnicodeDecodeError:
-                break
-    in_file.close()
-    hdr_list = [header[i:i+80] for i in range(0, len(header), 80)]
-
-    # Remove all the empty entries
-    while(" "*80 in hdr_list) : 
-        hdr_list.remove(" "*80) 
-
-    # Make a new string list where we put all the information together correctly
+        return in_file.read(2) == _GZIP_MAGIC
+
+
+def _open_fits(in_filename):
+    """
+    Open a plain or gzip-compressed FITS file for binary reading.
+    """
+    if _is_gzipped(in_filename):
+        return gzip.open(in_filename, 'rb')
+    return open(in_filename, 'rb')
+
+
+def _read_header_cards(in_file):
+    """
+    Read the primary header of an open FITS file object block by block.
+
+    Reads whole 2880-byte FITS blocks until the block holding the END card,
+    so the raw header is never re-read or re-concatenated.
+
+    Returns
+    -------
+    cards : list of str
+        The 80-character header cards up to and including END, with the
+        blank cards dropped.
+    header_size : int
+        Size of the header in bytes, i.e. the offset of the data section.
+    """
+    cards = []
+    header_size = 0
+    while True:
+        block = in_file.read(FITS_BLOCK)
+        if len(block) < FITS_BLOCK:
+            raise EOFError("Reached end of file before the END card of the FITS header.")
+        header_size += FITS_BLOCK
+        block = block.decode("utf-8")
+        for i in range(0, FITS_BLOCK, FITS_CARD):
+            card = block[i:i+FITS_CARD]
+            if card == _BLANK_CARD:
+                continue
+            cards.append(card)
+            if card[0:8] == 'END     ':
+                return cards, header_size
+
+
+def _join_continue_cards(hdr_list):
+    """
+    Merge every keyword and its CONTINUE cards into one long card string.
+    """
     hdr_list_new = []
-    for count, item in enumerate(hdr_list):
-        if count <= len(hdr_list)-2:
-            if hdr_list[count][0:8] != 'CONTINUE' and hdr_list[count+1][0:8] != 'CONTINUE':
-                hdr_list_new.append(hdr_list[count])
-            else:
-                if hdr_list[count][0:8] != 'CONTINUE' and hdr_list[count+1][0:8] == 'CONTINUE':
-                    ampersand_pos = hdr_list[count].find('&')
-                    if ampersand_pos != -1:
-                        new_entry = hdr_list[count][0:ampersand_pos]
-                    else:
-                        # Raise exception here because there should be an ampersand at the end of a CONTINUE'd keyword
-                        raise Exception("There should be an ampersand at the end of a CONTINUE'd keyword.")
-                
-                    tmp_count = 1
-                    while hdr_list[count+tmp_count][0:8] == 'CONTINUE':
-                        ampersand_pos = hdr_list[count+tmp_count].find('&')
-                        if ampersand_pos != -1:
-                            first_sq_pos = hdr_list[count+tmp_count].find("'")
-                            if first_sq_pos != -1:
-                                new_entry = new_entry+hdr_list[count+tmp_count][first_sq_pos+1:ampersand_pos]
-                            else:
-                                # Raise exception here because there should be a single quote after CONTINUE
-                                raise Exception("There should be two single quotes after CONTINUE. Did not find any.")
-                        
-                        else:
-                            # If there is no ampersand at the end anymore, it means the entry ends here.
-                            # Read from the first to the second single quote in this case.
-                            first_sq_pos = hdr_list[count+tmp_count].find("'")
-                            if first_sq_pos != -1:
-                                second_sq_pos = hdr_list[count+tmp_count][first_sq_pos+1:].find("'")
-                                if second_sq_pos != -1:
-                                    new_entry = new_entry+hdr_list[count+tmp_count][first_sq_pos+1:second_sq_pos+1+first_sq_pos].rstrip()+"'"
-                                else:
-                                    # Raise exception here because there should be a second single quote after CONTINUE
-                                    raise Exception("There should be two single quotes after CONTINUE. Found the first, but not the second.")
-                                
-                            else:
-                                # Raise exception here because there should be a (first) single quote after CONTINUE
-                                raise Exception("There should be two single quotes after CONTINUE. Did not find any.")
-
-                        tmp_count += 1
-                        
-                    hdr_list_new.append(new_entry)
-            
-                else:
-                    continue
+    n_cards = len(hdr_list)
+    count = 0
+    while count < n_cards:
+        item = hdr_list[count]
+        if item[0:8] == 'CONTINUE':
+            # Orphan CONTINUE card without a keyword in front of it
+            count += 1
+            continue
+
+        if count == n_cards-1 or hdr_list[count+1][0:8] != 'CONTINUE':
+            hdr_list_new.append(item)
+            count += 1
+            continue
 
+        ampersand_pos = item.find('&')
+        if ampersand_pos != -1:
+            new_entry = [item[0:ampersand_pos]]
         else:
-            # Add END at the end of the header
-            hdr_list_new.append(hdr_list[count])
+            # Raise exception here because there should be an ampersand at the end of a CONTINUE'd keyword
+            raise Exception("There should be an ampersand at the end of a CONTINUE'd keyword.")
+
+        count += 1
+        while count < n_cards and hdr_list[count][0:8] == 'CONTINUE':
+            this_card = hdr_list[count]
+            ampersand_pos = this_card.find('&')
+            first_sq_pos = this_card.find("'")
+            if first_sq_pos == -1:
+                # Raise exception here because there should be a single quote after CONTINUE
+                raise Exception("There should be two single quotes after CONTINUE. Did not find any.")
+            if ampersand_pos != -1:
+                new_entry.append(this_card[first_sq_pos+1:ampersand_pos])
+            else:
+                # If there is no ampersand at the end anymore, it means the entry ends here.
+                # Read from the first to the second single quote in this case.
+                second_sq_pos = this_card.find("'", first_sq_pos+1)
+                if second_sq_pos == -1:
+                    # Raise exception here because there should be a second single quote after CONTINUE
+                    raise Exception("There should be two single quotes after CONTINUE. Found the first, but not the second.")
+                new_entry.append(this_card[first_sq_pos+1:second_sq_pos].rstrip()+"'")
+            count += 1
+
+        hdr_list_new.append(''.join(new_entry))
 
-    # Now we stitch together the CONTINUE information correctly,
-    # with a "\n" at the end that we use as a separator later on
-    # when we convert from a string to an astropy header.
+    return hdr_list_new
+
+
+def _split_long_cards(hdr_list_new):
+    """
+    Re-wrap merged entries longer than one card into standard CONTINUE cards.
+
+    Wrapped entries keep "\n" between their cards, which is used as the
+    separator when the list is turned into an astropy header.
+    """
     for count, item in enumerate(hdr_list_new):
         if len(item) > 80:
-            this_entry = item[0:78]+"&'\n"
-            rest       = "CONTINUE  '"+item[78:]
-            while len(rest) > 80:
-                this_entry = this_entry + rest[0:78] + "&'\n"
-                rest       = "CONTINUE  '"+ rest[78:]
-            this_entry = this_entry + rest
-            hdr_list_new[count] = this_entry
-    
+            pieces = [item[0:78]+"&'"]
+            rest = item[78:]
+            while len(rest) > 69:
+                pieces.append("CONTINUE  '"+rest[0:67]+"&'")
+                rest = rest[67:]
+            pieces.append("CONTINUE  '"+rest)
+            hdr_list_new[count] = '\n'.join(pieces)
+    return hdr_list_new
+
+
+def _corrected_header(in_file):
+    """
+    Read and repair the primary header of an open FITS file object.
+
+    Returns the corrected header and the byte offset of the data section.
+    """
+    hdr_list, header_size = _read_header_cards(in_file)
+    hdr_list_new = _split_long_cards(_join_continue_cards(hdr_list))
+
     # Now we should have the correct list of strings. Since we can't convert a list to a
     # fits header directly, we have to convert it to a string first, separated by "\n".
-    hdr_str_new = '\n'.join([str(item) for item in hdr_list_new]) 
+    hdr_str_new = '\n'.join(hdr_list_new)
 
     # And finally we create the new corrected astropy fits header from that string
-    hdr_corr = fits.Header.fromstring(hdr_str_new, sep='\n')
+    return fits.Header.fromstring(hdr_str_new, sep='\n'), header_size
+
+
+@instrument('header')
+def fix_suvi_l1b_header(in_filename):
+    # Read the header in whole FITS blocks up to the END card and repair the
+    # CONTINUE'd keywords by hand. Since astropy version 4.2.1, we can't use
+    # the .to_string() method anymore because of FITS header consistency checks
+    # that cannot be overridden.
+    with _open_fits(in_filename) as in_file:
+        hdr_corr, _ = _corrected_header(in_file)
 
     # Return the corrected header
-    return hdr_corr
\ No newline at end of file
+    return hdr_corr
+
+
+def _data_layout(hdr):
+    """
+    Return the numpy dtype, array shape and size in bytes of the primary data.
+    """
+    bitpix = hdr['BITPIX']
+    if bitpix not in _BITPIX_DTYPES:
+        raise ValueError(f"Unsupported BITPIX value: {bitpix}")
+    dtype = np.dtype(_BITPIX_DTYPES[bitpix])
+    naxis = hdr['NAXIS']
+    if naxis == 0:
+        raise ValueError("The primary HDU has no data.")
+    shape = tuple(hdr[f'NAXIS{i}'] for i in range(naxis, 0, -1))
+    return dtype, shape, dtype.itemsize * int(np.prod(shape))
+
+
+def _hdu_data_size(cards):
+    """
+    Size in bytes of the data of an HDU, without padding, from its header cards.
+    """
+    values = {}
+    for card in cards:
+        key = card[0:8].strip()
+        if key in ('BITPIX', 'NAXIS', 'PCOUNT', 'GCOUNT') or key[:5] == 'NAXIS':
+            values[key] = int(card[10:].split('/')[0])
+    naxis = values.get('NAXIS', 0)
+    if naxis == 0:
+        return 0
+    n_pixels = int(np.prod([values[f'NAXIS{i}'] for i in range(1, naxis+1)]))
+    return abs(values['BITPIX']) // 8 * values.get('GCOUNT', 1) * (values.get('PCOUNT', 0) + n_pixels)
+
+
+def fits_complete(in_filename):
+    """
+    Whether a plain or gzip-compressed FITS file is whole, i.e. not truncated.
+
+    Every HDU header must end with an END card, and the file must end
+    exactly after the padded data of its last HDU. Only the headers are
+    read from plain files; gzip'd files are decompressed to check them.
+    """
+    size = os.path.getsize(in_filename) if not _is_gzipped(in_filename) else None
+    try:
+        with _open_fits(in_filename) as in_file:
+            n_hdus = 0
+            while in_file.peek(1):
+                cards, _ = _read_header_cards(in_file)
+                end = in_file.tell() + -(-_hdu_data_size(cards) // FITS_BLOCK) * FITS_BLOCK
+                # Seeking past the end clamps in a gzip file, not in a plain one
+                if in_file.seek(end) != end or (size is not None and end > size):
+                    return False
+                n_hdus += 1
+            return n_hdus > 0
+    except (EOFError, ValueError, KeyError, UnicodeDecodeError, OSError):
+        return False
+
+
+@instrument('header')
+def _decompressed_path(in_filename, decompress_dir):
+    """
+    Where read_suvi_l1b keeps the decompressed data section of a gzip'd file.
+    """
+    base = os.path.basename(in_filename)
+    if base.endswith('.gz'):
+        base = base[:-3]
+    return os.path.join(decompress_dir, base + '.data')
+
+
+def read_suvi_l1b(in_filename, decompress_dir=None):
+    """
+    Read a SUVI L1b file into a SunPy Map without loading its pixels.
+
+    The header is repaired with the same logic as fix_suvi_l1b_header and
+    its length gives the offset of the data section, which is exposed as a
+    read-only np.memmap. Only the pixels that are actually used (e.g. by a
+    cutout, a mask or a row-tiled suvi_restore_dn) are read from disk.
+
+    Parameters
+    ----------
+    in_filename : str
+        Path to a SUVI L1b FITS file, optionally gzip-compressed.
+    decompress_dir : str, optional
+        Compressed files cannot be memory-mapped. If given, the data section
+        of a gzip'd file is decompressed once into this directory and mapped
+        from there (later reads reuse it). Otherwise it is read into memory.
+
+    Returns
+    -------
+    sunpy.map.GenericMap
+        Map with the corrected header and memory-mapped data. If the header
+        has BSCALE/BZERO scaling, the scaled data is returned in memory.
+    """
+    from sunpy.map import Map
+
+    gzipped = _is_gzipped(in_filename)
+    opener = gzip.open if gzipped else open
+    with opener(in_filename, 'rb') as in_file:
+        hdr_corr, header_size = _corrected_header(in_file)
+        dtype, shape, nbytes = _data_layout(hdr_corr)
+
+        if not gzipped:
+            data = np.memmap(in_filename, dtype=dtype, mode='r',
+                             offset=header_size, shape=shape)
+        elif decompress_dir is None:
+            data = np.frombuffer(in_file.read(nbytes), dtype=dtype).reshape(shape)
+        else:
+            raw_filename = _decompressed_path(in_filename, decompress_dir)
+            if not (os.path.exists(raw_filename) and os.path.getsize(raw_filename) == nbytes):
+                os.makedirs(decompress_dir, exist_ok=True)
+                tmp_filename = raw_filename + '.part'
+                with open(tmp_filename, 'wb') as raw_file:
+                    remaining = nbytes
+                    while remaining > 0:
+                        chunk = in_file.read(min(remaining, 1 << 24))
+                        if not chunk:
+                            raise EOFError(f"{in_filename} ends inside its data section.")
+                        raw_file.write(chunk)
+                        remaining -= len(chunk)
+                os.replace(tmp_filename, raw_filename)
+            data = np.memmap(raw_filename, dtype=dtype, mode='r', shape=shape)
+
+    # Scaled integer data has to be converted, which loads it
+    bscale = hdr_corr.get('BSCALE', 1)
+    bzero = hdr_corr.get('BZERO', 0)
+    if bscale != 1 or bzero != 0:
+        data = data * bscale + bzero
+
+    return Map(data, hdr_corr)
@@ -0,0 +1,260 @@
+import os, glob, sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from astropy.io import fits
+from astropy.time import Time
+
+from .correct_suvi_header import _open_fits, _corrected_header
+from .suvi_restore_dn import SuviIndex
+
+# Header keywords stored in the catalog. Column names are the lower-case
+# keyword with '-' replaced by '_' (DATE-OBS → date_obs).
+CATALOG_KEYWORDS = (
+    'INSTRUME', 'WAVELNTH', 'FILTER1', 'FILTER2', 'CCD_TMP1', 'DATE-OBS',
+    'EXPTIME', 'NAXIS1', 'NAXIS2', 'CRPIX1', 'CRPIX2', 'CRVAL1', 'CRVAL2',
+    'CDELT1', 'CDELT2', 'CROTA2', 'DSUN_OBS', 'RSUN_OBS',
+)
+_TEXT_KEYWORDS = {'INSTRUME', 'FILTER1', 'FILTER2', 'DATE-OBS'}
+
+
+def _column(keyword):
+    return keyword.lower().replace('-', '_')
+
+
+_COLUMNS = [_column(k) for k in CATALOG_KEYWORDS]
+
+
+def _normalise_time(value):
+    """
+    Bring a DATE-OBS value or query bound to a sortable ISO string.
+
+    Strings and datetimes are parsed with astropy Time, so that e.g.
+    '2024-01-01', '2024-01-01 12:00' and '2024-01-01T12:00:00.000Z' all
+    become 'YYYY-MM-DDThh:mm:ss.sss' and compare correctly. Strings that
+    cannot be parsed are kept as they are (stripped).
+    """
+    if value is None:
+        return None
+    if not hasattr(value, 'isot'):
+        try:
+            value = Time(value.strip() if isinstance(value, str) else value)
+        except ValueError:
+            return str(value).strip().rstrip('Z')
+    return value.isot
+
+
+def _read_catalog_header(path):
+    """
+    Read the header of a SUVI or AIA file.
+
+    SUVI L1b headers are repaired block by block without touching the data.
+    Tile-compressed files (e.g. AIA) have an empty primary HDU, in which
+    case the header of the first extension is used.
+    """
+    with _open_fits(path) as in_file:
+        hdr, _ = _corrected_header(in_file)
+    if hdr.get('NAXIS', 0) == 0:
+        hdr = fits.getheader(path, 1)
+    return hdr
+
+
+def _catalog_row(path):
+    """
+    Extract one catalog row from a file; runs in the worker processes.
+
+    A file that cannot be read (e.g. a partial download) gives
+    {'path': path, 'error': message} instead, so one bad file does not
+    abort a scan.
+    """
+    try:
+        stat = os.stat(path)
+        hdr = _read_catalog_header(path)
+    except Exception as e:
+        return {'path': path, 'error': f"{type(e).__name__}: {e}"}
+    row = {'path': path, 'mtime': stat.st_mtime, 'size': stat.st_size}
+    for keyword, column in zip(CATALOG_KEYWORDS, _COLUMNS):
+        value = hdr.get(keyword)
+        if isinstance(value, str):
+            value = value.strip()
+        row[column] = value
+    row['date_obs'] = _normalise_time(row['date_obs'])
+    return row
+
+
+class HeaderCatalog:
+    """
+    Persistent SQLite catalog of SUVI/AIA header keywords.
+
+    Rescans only re-read files whose mtime or size changed, and queries
+    are answered from the catalog without opening any FITS file.
+
+    Parameters
+    ----------
+    db_path : str
+        Path to the SQLite file; created if missing.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.row_factory = sqlite3.Row
+        columns = ', '.join(
+            f"{_column(k)} {'TEXT' if k in _TEXT_KEYWORDS else 'REAL'}"
+            for k in CATALOG_KEYWORDS
+        )
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS frames ("
+                f"path TEXT PRIMARY KEY, mtime REAL, size INTEGER, {columns})"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS frames_wavelnth_time "
+                "ON frames (wavelnth, date_obs)"
+            )
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM frames").fetchone()[0]
+
+    def update(self, roots, pattern='**/*.fits*', workers=None, prune=True):
+        """
+        Scan directory trees and bring the catalog up to date.
+
+        Parameters
+        ----------
+        roots : str or list of str
+            Directories to scan.
+        pattern : str, optional
+            Recursive glob pattern relative to each root.
+        workers : int, optional
+            Number of worker processes for header extraction.
+            Default: os.cpu_count(). 1 runs in this process.
+        prune : bool, optional
+            Remove catalog entries for files under roots that no longer exist.
+
+        Returns
+        -------
+        dict
+            Counts of 'added', 'updated', 'removed' and 'unchanged' files,
+            and 'errors': {path: message} for the files that could not be
+            read. These are left out of the catalog and retried on the next
+            update.
+        """
+        if isinstance(roots, (str, os.PathLike)):
+            roots = [roots]
+        roots = [os.path.abspath(r) for r in roots]
+
+        known = {
+            row['path']: (row['mtime'], row['size'])
+            for row in self._conn.execute("SELECT path, mtime, size FROM frames")
+        }
+
+        found = set()
+        todo = []
+        for root in roots:
+            for path in glob.iglob(os.path.join(root, pattern), recursive=True):
+                if not os.path.isfile(path):
+                    continue
+                found.add(path)
+                stat = os.stat(path)
+                if known.get(path) != (stat.st_mtime, stat.st_size):
+                    todo.append(path)
+
+        if workers == 1 or len(todo) < 2:
+            rows = [_catalog_row(p) for p in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                rows = list(pool.map(_catalog_row, todo, chunksize=64))
+
+        errors = {row['path']: row['error'] for row in rows if 'error' in row}
+        rows = [row for row in rows if 'error' not in row]
+
+        removed = []
+        if prune:
+            removed = [
+                p for p in known
+                if p not in found and any(p.startswith(r + os.sep) for r in roots)
+            ]
+
+        all_columns = ['path', 'mtime', 'size'] + _COLUMNS
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO frames ({', '.join(all_columns)}) "
+                f"VALUES ({', '.join('?' * len(all_columns))})",
+                [tuple(row[c] for c in all_columns) for row in rows]
+            )
+            # Unreadable files are not cataloged; drop their old rows, which no longer match
+            self._conn.executemany(
+                "DELETE FROM frames WHERE path = ?", [(p,) for p in removed + list(errors)]
+            )
+
+        added = sum(1 for row in rows if row['path'] not in known)
+        return {
+            'added': added,
+            'updated': len(rows) - added,
+            'removed': len(removed),
+            'unchanged': len(found) - len(todo),
+            'errors': errors,
+        }
+
+    def query(self, wavelnth=None, filter1=None, filter2=None, start=None,
+              end=None, instrument=None):
+        """
+        Select catalog rows, ordered by DATE-OBS.
+
+        Parameters
+        ----------
+        wavelnth : int, optional
+            Wavelength in Angstrom.
+        filter1, filter2 : str, optional
+            Filter wheel positions (SUVI), e.g. 'Thin_Al'.
+        start, end : str, datetime or astropy.time.Time, optional
+            DATE-OBS range, start inclusive and end exclusive.
+        instrument : str, optional
+            INSTRUME value, e.g. 'GOES-R Series Solar Ultraviolet Imager'.
+
+        Returns
+        -------
+        list of dict
+        """
+        clauses, params = [], []
+        for column, value in (('wavelnth', wavelnth), ('filter1', filter1),
+                              ('filter2', filter2), ('instrume', instrument)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            clauses.append("date_obs >= ?")
+            params.append(_normalise_time(start))
+        if end is not None:
+            clauses.append("date_obs < ?")
+            params.append(_normalise_time(end))
+
+        sql = "SELECT * FROM frames"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY date_obs"
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    @staticmethod
+    def suvi_indices(rows):
+        """
+        Build SuviIndex records from catalog rows, e.g. for suvi_restore_dn_batch.
+        """
+        return [
+            SuviIndex(
+                wavelnth=int(row['wavelnth']),
+                filter1=row['filter1'],
+                filter2=row['filter2'],
+                ccd_tmp1=float(row['ccd_tmp1'])
+            )
+            for row in rows
+        ]
@@ -0,0 +1,215 @@
+"""
+Opt-in stage timing and memory instrumentation.
+
+Public functions of the toolkit are wrapped with ``@instrument(stage)``.
+While instrumentation is off (the default) the wrapper only checks one
+flag. It is switched on for the whole process with the environment
+variable SOLAR_CODES_PROFILE=1 (or =memory to also trace allocation
+peaks), or for a block of code with::
+
+    with profiling() as stats:
+        run_suvi_pipeline(...)
+    print(stats)
+
+For every instrumented function it records the number of calls, wall
+time, bytes read and written by the process during the call (from
+/proc/self/io, Linux only; 0 elsewhere), the size of the arrays it returns
+and, in memory mode, the tracemalloc peak of the outermost call. Nested
+instrumented calls are included in their caller's time. Calls made in
+worker processes (e.g. sun_register_sequence with workers > 1) are
+recorded in those processes, not in the parent.
+"""
+import os, json, time, threading, tracemalloc
+from functools import wraps
+
+import numpy as np
+
+ENV_VAR = 'SOLAR_CODES_PROFILE'
+_PROC_IO = '/proc/self/io'
+
+_FIELDS = ('calls', 'seconds', 'bytes_read', 'bytes_written', 'array_bytes', 'peak_bytes')
+
+
+class _State:
+    enabled = os.environ.get(ENV_VAR, '').lower() not in ('', '0', 'false', 'off')
+    memory = os.environ.get(ENV_VAR, '').lower() == 'memory'
+
+
+_state = _State()
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+_stages = {}
+
+
+def enable(memory=False):
+    _state.enabled = True
+    _state.memory = memory
+
+
+def disable():
+    _state.enabled = False
+    _state.memory = False
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def _io_counters():
+    """
+    (bytes read, bytes written) by this process so far, or (0, 0).
+    """
+    try:
+        with open(_PROC_IO) as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _array_bytes(obj, depth=0):
+    """
+    Total size of the numpy arrays in a return value (maps, sequences and
+    tuples are searched one level deep).
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if depth > 1:
+        return 0
+    data = getattr(obj, 'data', None)
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    maps = getattr(obj, 'maps', None)
+    if isinstance(maps, list):
+        return sum(_array_bytes(m, depth + 1) for m in maps)
+    if isinstance(obj, (tuple, list)):
+        return sum(_array_bytes(item, depth + 1) for item in obj)
+    return 0
+
+
+def _record(name, stage, seconds, read, written, array_bytes, peak):
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = dict.fromkeys(_FIELDS, 0)
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['bytes_read'] += read
+        entry['bytes_written'] += written
+        entry['array_bytes'] += array_bytes
+        entry['peak_bytes'] = max(entry['peak_bytes'], peak)
+        _stages[name] = stage
+
+
+def instrument(stage):
+    """
+    Decorator recording a function's calls under ``stage`` while profiling is on.
+    """
+    def decorator(func):
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+
+            depth = getattr(_local, 'depth', 0)
+            trace = _state.memory and depth == 0
+            if trace:
+                tracing = tracemalloc.is_tracing()
+                if not tracing:
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+            read0, written0 = _io_counters()
+            t0 = time.perf_counter()
+            _local.depth = depth + 1
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                _local.depth = depth
+                seconds = time.perf_counter() - t0
+                read1, written1 = _io_counters()
+                peak = 0
+                if trace:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    if not tracing:
+                        tracemalloc.stop()
+            _record(name, stage, seconds, read1 - read0, written1 - written0,
+                    _array_bytes(result), peak)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def summary(by='stage'):
+    """
+    Recorded totals, keyed by stage (default) or by function name.
+
+    Every entry has calls, seconds, bytes_read, bytes_written, array_bytes
+    (returned arrays) and peak_bytes (largest tracemalloc peak, memory mode).
+    """
+    if by not in ('stage', 'function'):
+        raise ValueError("by must be 'stage' or 'function'")
+    with _lock:
+        if by == 'function':
+            return {name: dict(entry, stage=_stages[name]) for name, entry in _stats.items()}
+        out = {}
+        for name, entry in _stats.items():
+            total = out.setdefault(_stages[name], dict.fromkeys(_FIELDS, 0))
+            for field in _FIELDS:
+                if field == 'peak_bytes':
+                    total[field] = max(total[field], entry[field])
+                else:
+                    total[field] += entry[field]
+        return out
+
+
+def write_jsonl(file, by='stage', **extra):
+    """
+    Append one JSON line per stage (or function) to a path or open file.
+
+    extra: fields added to every line, e.g. run='2021-10-28' or host=...
+    """
+    timestamp = time.time()
+    lines = [
+        json.dumps(dict(extra, time=timestamp, **{by: key}, **entry))
+        for key, entry in summary(by).items()
+    ]
+    if hasattr(file, 'write'):
+        file.write(''.join(line + '\n' for line in lines))
+        return
+    with open(file, 'a') as f:
+        f.write(''.join(line + '\n' for line in lines))
+
+
+class profiling:
+    """
+    Context manager that switches instrumentation on for a block.
+
+    Yields a dict that is filled with summary(by) when the block exits;
+    with reset (the default) only the calls inside the block are counted.
+    """
+
+    def __init__(self, memory=False, by='stage', reset=True):
+        self.memory = memory
+        self.by = by
+        self.reset = reset
+        self.stats = {}
+
+    def __enter__(self):
+        self._previous = (_state.enabled, _state.memory)
+        if self.reset:
+            reset()
+        enable(self.memory)
+        return self.stats
+
+    def __exit__(self, *exc):
+        _state.enabled, _state.memory = self._previous
+        self.stats.update(summary(self.by))
@@ -1,8 +1,175 @@
 import numpy as np
-from sunpy.map import Map, MapSequence
-import os, asdf
+from sunpy.map import Map, MapSequence, GenericMap
+from collections import OrderedDict
+import os, glob, shutil, itertools, asdf
+try:
+    from .instrument import instrument
+except ImportError:  # imported as a top-level module
+    from instrument import instrument
 
-def save_asdf_map(obj, path=None, filename=None, compress=False):
+_MISSING = None ## Placeholder for a key absent from a frame in the cube layout
+
+
+def _split_meta(metas):
+    """
+    Split per-frame metadata into keys shared by every frame and varying keys.
+
+    Returns a dict with the key order, the shared ``base`` values and, for
+    every other key, a ``varying`` list with one value per frame (None where
+    the frame does not have the key).
+    """
+    keys = list(dict.fromkeys(k for meta in metas for k in meta))
+    base, varying = {}, {}
+    first = metas[0]
+    for key in keys:
+        if key in first and all(key in meta and _same_value(meta[key], first[key]) for meta in metas):
+            base[key] = first[key]
+        else:
+            varying[key] = [meta.get(key, _MISSING) for meta in metas]
+    return {"keys": keys, "base": base, "varying": varying}
+
+
+def _same_value(a, b):
+    try:
+        return bool(a == b) and type(a) is type(b)
+    except (TypeError, ValueError):
+        return False
+
+
+def _frame_meta(meta_tree, i):
+    """
+    Rebuild the metadata of frame i from the output of _split_meta.
+    """
+    base, varying = meta_tree["base"], meta_tree["varying"]
+    meta = {}
+    for key in meta_tree["keys"]:
+        if key in base:
+            meta[key] = base[key]
+        elif varying[key][i] is not _MISSING:
+            meta[key] = varying[key][i]
+    return meta
+
+
+COMPRESSION_CODECS = ("zlib", "bzp2", "lz4") ## Block compressions supported by ASDF ("lz4" needs the lz4 package)
+
+
+def _compression(compress):
+    """
+    Map the compress argument (bool or codec name) to an ASDF compression label.
+    """
+    if compress is True:
+        return "zlib"
+    if not compress:
+        return None
+    if compress not in COMPRESSION_CODECS:
+        raise ValueError(f"Unknown compression {compress!r}, use one of {COMPRESSION_CODECS}")
+    return compress
+
+
+def _as_integer(arr):
+    """
+    Return a float array as int16/int32 if that is lossless, else None.
+    """
+    if arr.dtype.kind != "f" or arr.size == 0 or not np.isfinite(arr).all():
+        return None
+    if not np.array_equal(arr, np.rint(arr)):
+        return None
+    lo, hi = arr.min(), arr.max()
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return arr.astype(dtype)
+    return None
+
+
+def _encode_array(arr, integer=False, tile_shape=None):
+    """
+    Prepare an array for the ASDF tree.
+
+    Without options the array is stored as is. With ``integer``, float data
+    that holds only whole numbers (e.g. DN) is stored as int16/int32 and
+    cast back on reading. With ``tile_shape``, the trailing axes are cut into
+    tiles stored as separate (separately compressed) blocks, so a region
+    read only decompresses the tiles it touches.
+    """
+    stored = _as_integer(arr) if integer else None
+    if stored is None and tile_shape is None:
+        return arr
+    if stored is None:
+        stored = arr
+
+    node = {"shape": list(arr.shape), "dtype": arr.dtype.str}
+    if tile_shape is None:
+        node["array"] = stored
+        return node
+
+    tile_shape = [int(t) for t in tile_shape]
+    lead = arr.ndim - len(tile_shape)
+    if lead < 0:
+        raise ValueError(f"tile_shape {tile_shape} has more axes than the data {arr.shape}")
+    grid = [-(-n // t) for n, t in zip(arr.shape[lead:], tile_shape)]
+    tiles = []
+    for tile_index in itertools.product(*(range(g) for g in grid)):
+        key = (Ellipsis,) + tuple(slice(i*t, (i+1)*t) for i, t in zip(tile_index, tile_shape))
+        # Always copy: ASDF writes views of one array as a single block
+        tiles.append(np.array(stored[key], order="C"))
+    node.update({"tile_shape": tile_shape, "grid": grid, "tiles": tiles})
+    return node
+
+
+def _decode_array(node, key=()):
+    """
+    Read an array written by _encode_array, optionally only the region ``key``.
+
+    ``key`` is a tuple of integers and step-1 slices over the leading axes,
+    as in ``array[key]``. For tiled arrays only the tiles that overlap the
+    region are read.
+    """
+    if not isinstance(node, dict):
+        return np.asarray(node)[key]
+
+    dtype = np.dtype(node["dtype"])
+    if "tiles" not in node:
+        return np.asarray(node["array"])[key].astype(dtype)
+
+    shape = node["shape"]
+    key = tuple(key) + (slice(None),) * (len(shape) - len(key))
+    ranges, squeeze = [], []
+    for axis, (k, n) in enumerate(zip(key, shape)):
+        if isinstance(k, slice):
+            start, stop, step = k.indices(n)
+            if step != 1:
+                raise ValueError("Only step-1 slices are supported for tiled arrays.")
+            ranges.append((start, max(start, stop)))
+        else:
+            k = k + n if k < 0 else k
+            ranges.append((k, k + 1))
+            squeeze.append(axis)
+
+    lead = len(shape) - len(node["tile_shape"])
+    out = np.empty([b - a for a, b in ranges], dtype=dtype)
+    tile_ranges = [
+        range(a // t, -(-b // t)) for (a, b), t in zip(ranges[lead:], node["tile_shape"])
+    ]
+    lead_key = tuple(slice(a, b) for a, b in ranges[:lead])
+    for tile_index in itertools.product(*tile_ranges):
+        flat = np.ravel_multi_index(tile_index, node["grid"])
+        src, dst = [], []
+        for i, t, (a, b) in zip(tile_index, node["tile_shape"], ranges[lead:]):
+            lo, hi = max(a, i*t), min(b, (i+1)*t)
+            src.append(slice(lo - i*t, hi - i*t))
+            dst.append(slice(lo - a, hi - a))
+        out[(Ellipsis,) + tuple(dst)] = np.asarray(node["tiles"][flat])[lead_key + tuple(src)]
+    return out.reshape([n for axis, n in enumerate(out.shape) if axis not in squeeze])
+
+
+def _cube_compatible(obj):
+    return len({(m.data.shape, m.data.dtype) for m in obj}) == 1
+
+
+@instrument('asdf_io')
+def save_asdf_map(obj, path=None, filename=None, compress=False, layout="list",
+                  integer=False, tile_shape=None):
     """
     Save a SunPy Map or MapSequence to an ASDF file, preserving full metadata.
 
@@ -15,16 +182,36 @@ def save_asdf_map(obj, path=None, filename=None, compress=False):
         If a directory is provided, a filename will be auto-generated.
     filename : str, optional
         Name of the ASDF file (used if 'path' is a directory or None).
-    compress : bool, optional
-        If True, compress all array data with zlib (lossless).
+    compress : bool or str, optional
+        Lossless block compression: True or 'zlib', 'bzp2' or 'lz4'.
+    layout : {'list', 'cube', 'auto'}, optional
+        How a MapSequence is stored. 'list' (default) writes one data/meta
+        pair per map. 'cube' writes all frames as one (N, ny, nx) array and
+        the metadata once, as shared values plus per-frame columns for the
+        keys that vary; all frames must have the same shape and dtype.
+        'auto' uses 'cube' whenever the frames allow it.
+    integer : bool, optional
+        Store float arrays holding only whole numbers (e.g. DN) as int16 or
+        int32, which compresses much better; read back as the original
+        float dtype. Arrays that would lose information stay float.
+    tile_shape : tuple of int, optional
+        Store every array in tiles of this shape over its trailing axes,
+        e.g. (512, 512), so that read_asdf_roi decompresses only the tiles
+        a region touches. In the cube layout every tile holds one frame; a
+        compressed cube without tile_shape is stored as one block per frame,
+        so a lazy read decompresses only the frames it uses.
     """
+    compression = _compression(compress)
+    if tile_shape is not None:
+        tile_shape = tuple(tile_shape)
+
     # Determine filename and directory behavior
     if path is None and filename is None:
         raise ValueError("You must specify either 'path' or 'filename'.")
 
     if path and os.path.isdir(path):
         if filename is None:
-            base = "map_sequence.asdf" if isinstance(obj, sunpy.map.MapSequence) else "map.asdf"
+            base = "map_sequence.asdf" if isinstance(obj, MapSequence) else "map.asdf"
         else:
             base = filename
         filepath = os.path.join(path, base)
@@ -35,16 +222,36 @@ def save_asdf_map(obj, path=None, filename=None, compress=False):
     else:
         raise ValueError("Invalid combination of 'path' and 'filename'.")
 
+    if layout not in ("list", "cube", "auto"):
+        raise ValueError(f"Unknown layout: {layout}")
+
     # Build ASDF tree
-    if isinstance(obj, MapSequence):
+    if isinstance(obj, MapSequence) and layout != "list" and (layout == "cube" or _cube_compatible(obj)):
+        if not _cube_compatible(obj):
+            raise ValueError("The cube layout needs all maps to have the same shape and dtype.")
+        frame_shape = obj.maps[0].data.shape
+        if tile_shape is not None and len(tile_shape) < len(frame_shape) + 1:
+            cube_tiles = (1,) + tile_shape
+        elif tile_shape is None and compression:
+            cube_tiles = (1,) + frame_shape
+        else:
+            cube_tiles = tile_shape
         tree = {
             "type": "sunpy.map.MapSequence",
-            "maps": [{"data": m.data, "meta": dict(m.meta)} for m in obj],
+            "layout": "cube",
+            "data": _encode_array(np.stack([m.data for m in obj]), integer, cube_tiles),
+            "meta": _split_meta([dict(m.meta) for m in obj]),
+        }
+    elif isinstance(obj, MapSequence):
+        tree = {
+            "type": "sunpy.map.MapSequence",
+            "maps": [{"data": _encode_array(m.data, integer, tile_shape), "meta": dict(m.meta)}
+                     for m in obj],
         }
     elif isinstance(obj, GenericMap):
         tree = {
             "type": "sunpy.map.GenericMap",
-            "data": obj.data,
+            "data": _encode_array(obj.data, integer, tile_shape),
             "meta": dict(obj.meta),
         }
     else:
@@ -52,33 +259,512 @@ def save_asdf_map(obj, path=None, filename=None, compress=False):
 
     # Write ASDF file
     with asdf.AsdfFile(tree) as af:
-        if compress:
-            af.write_to(filepath, all_array_compression="zlib")
+        if compression:
+            af.write_to(filepath, all_array_compression=compression)
         else:
             af.write_to(filepath)
 
 
-def read_asdf_map(filepath):
+class AsdfMapWriter:
+    """
+    Write a long map time series to an ASDF file one map at a time.
+
+    Maps are buffered and flushed every ``batch_size`` maps as a complete
+    ASDF batch file in ``<filepath>.parts/`` (written to a temporary name and
+    renamed, so a batch file on disk is always complete). close() writes
+    ``filepath`` as a small index of the batches, which read_asdf_map and
+    the other readers follow, so every pixel is written to disk once.
+    Keep ``filepath`` and ``<filepath>.parts/`` together when moving them.
+
+    close(join=True) instead copies all batches into one self-contained
+    ``filepath`` and removes them. That reads every batch back and writes
+    the whole sequence again, i.e. twice the disk traffic of the series;
+    pixel memory stays at one batch, and the metadata of all maps is held.
+
+    If a run is interrupted, the batches already flushed are kept: a writer
+    opened on the same filepath with ``resume=True`` appends after them
+    (n_written tells how many input maps to skip), and
+    AsdfMapWriter.recover(filepath) turns them into a readable file.
+
+    Parameters
+    ----------
+    filepath : str
+        Target ASDF file.
+    batch_size : int, optional
+        Number of maps per flushed batch. Default: 32
+    compress : bool or str, optional
+        Compression of the batches (and of a joined file), as in
+        save_asdf_map.
+    resume : bool, optional
+        What to do with batches left by an earlier writer on the same
+        filepath: True appends after them, False discards them. If there
+        are such batches and resume is not given, a FileExistsError is
+        raised. Default: None
+    """
+
+    def __init__(self, filepath, batch_size=32, compress=False, resume=None):
+        self.filepath = filepath
+        self.batch_size = batch_size
+        self.compress = compress
+        _compression(compress)
+        self.parts_dir = filepath + ".parts"
+        if resume is None and self._batch_files():
+            raise FileExistsError(
+                f"{self.parts_dir} holds batches of an earlier writer; pass resume=True "
+                f"to append to them or resume=False to discard them.")
+        if not resume and os.path.isdir(self.parts_dir):
+            shutil.rmtree(self.parts_dir)
+        os.makedirs(self.parts_dir, exist_ok=True)
+        for tmp in glob.glob(os.path.join(self.parts_dir, "*.tmp")):
+            os.remove(tmp)
+        self._counts = []
+        for batch in self._batch_files():
+            with asdf.open(batch, lazy_load=True) as af:
+                self._counts.append(len(_tree_frames(af.tree)))
+        self._buffer = []
+        self._closed = False
+
+    @property
+    def n_written(self):
+        """
+        Number of maps in the flushed batches, including those of an earlier
+        run that was resumed. Buffered maps are not counted.
+        """
+        return sum(self._counts)
+
+    def _batch_files(self):
+        return sorted(glob.glob(os.path.join(self.parts_dir, "batch_*.asdf")))
+
+    def add(self, smap):
+        """
+        Append one map; flushes automatically every batch_size maps.
+        """
+        if self._closed:
+            raise ValueError("Writer is closed.")
+        self._buffer.append(smap)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered maps as one complete batch file.
+        """
+        if not self._buffer:
+            return
+        batch = os.path.join(self.parts_dir, f"batch_{len(self._counts):06d}.asdf")
+        save_asdf_map(MapSequence(self._buffer, sortby=None), filename=batch + ".tmp",
+                      compress=self.compress, layout="auto")
+        os.replace(batch + ".tmp", batch)
+        self._counts.append(len(self._buffer))
+        self._buffer = []
+
+    def close(self, join=False):
+        """
+        Flush the last batch and write filepath.
+
+        Parameters
+        ----------
+        join : bool, optional
+            If False, filepath is an index of the batches, which stay in
+            ``<filepath>.parts/``. If True, the batches are copied into a
+            self-contained filepath and removed (see the class docstring
+            for the cost). Default: False
+
+        Returns
+        -------
+        str
+            Path of the written file.
+        """
+        if self._closed:
+            return self.filepath
+        self.flush()
+
+        batch_files = self._batch_files()
+        if not join:
+            parts = os.path.basename(self.parts_dir)
+            tree = {
+                "type": "sunpy.map.MapSequence",
+                "layout": "parts",
+                "parts": [parts + "/" + os.path.basename(f) for f in batch_files],
+                "counts": list(self._counts),
+            }
+            with asdf.AsdfFile(tree) as out:
+                out.write_to(self.filepath + ".tmp")
+            os.replace(self.filepath + ".tmp", self.filepath)
+            self._closed = True
+            return self.filepath
+
+        opened = [asdf.open(f, lazy_load=True, memmap=True) for f in batch_files]
+        try:
+            maps = []
+            for af in opened:
+                frames = _tree_frames(af.tree)
+                for i in range(len(frames)):
+                    frame = frames[i]
+                    maps.append({"data": _decode_array(frame["data"]), "meta": dict(frame["meta"])})
+            tree = {"type": "sunpy.map.MapSequence", "maps": maps}
+            compression = _compression(self.compress)
+            with asdf.AsdfFile(tree) as out:
+                if compression:
+                    out.write_to(self.filepath + ".tmp", all_array_compression=compression)
+                else:
+                    out.write_to(self.filepath + ".tmp")
+        finally:
+            for af in opened:
+                af.close()
+        os.replace(self.filepath + ".tmp", self.filepath)
+        shutil.rmtree(self.parts_dir)
+        self._closed = True
+        return self.filepath
+
+    @classmethod
+    def recover(cls, filepath, compress=False, join=False):
+        """
+        Build filepath from the batches left by an interrupted writer.
+        """
+        return cls(filepath, compress=compress, resume=True).close(join=join)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep the complete batches on disk for resume/recover
+            self.flush()
+
+
+def _is_memmap(arr):
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        arr = getattr(arr, "base", None)
+    return False
+
+
+class _CubeFrames:
+    """
+    Per-frame {"data", "meta"} access to a cube-layout tree.
+
+    Tiled cubes (including every compressed cube written by save_asdf_map)
+    decode only the tiles of the requested frame. An untiled cube is kept
+    as its memory map; an untiled compressed cube (older files) is
+    decompressed by ASDF as a whole and one frame is copied out of it.
+    """
+
+    def __init__(self, tree):
+        self._tree = tree
+        self._cube = None
+
+    def __len__(self):
+        node = self._tree["data"]
+        return node["shape"][0] if isinstance(node, dict) else len(node)
+
+    def __getitem__(self, i):
+        node = self._tree["data"]
+        if isinstance(node, dict):
+            data = _decode_array(node, (i,))
+        elif self._cube is not None:
+            data = self._cube[i]
+        else:
+            cube = np.asarray(node)
+            if _is_memmap(cube):
+                self._cube = cube
+                data = cube[i]
+            else:
+                data = cube[i].copy()
+        return {"data": data, "meta": _frame_meta(self._tree["meta"], i)}
+
+
+def _tree_frames(tree):
+    """
+    Per-frame {"data", "meta"} access to a MapSequence tree of either layout.
+    """
+    return _CubeFrames(tree) if tree.get("layout") == "cube" else tree["maps"]
+
+
+class _PartsFrames:
+    """
+    Per-frame {"data", "meta"} access to a "parts" index written by
+    AsdfMapWriter. Each batch file is opened (memory-mapped) on first use.
+    """
+
+    def __init__(self, tree, filepath):
+        base = os.path.dirname(os.path.abspath(filepath))
+        self._paths = [os.path.join(base, *part.split("/")) for part in tree["parts"]]
+        self._starts = np.cumsum([0] + list(tree["counts"]))
+        self._opened = {}
+
+    def __len__(self):
+        return int(self._starts[-1])
+
+    def _batch(self, i):
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError(f"Frame {i} out of range for {n} frames.")
+        i = i % n
+        b = int(np.searchsorted(self._starts, i, side="right")) - 1
+        if b not in self._opened:
+            af = asdf.open(self._paths[b], lazy_load=True, memmap=True)
+            self._opened[b] = (af, _tree_frames(af.tree))
+        return self._opened[b], i - int(self._starts[b])
+
+    def locate(self, i):
+        """
+        Return the tree of the batch holding frame i and i within that batch.
+        """
+        (af, _), j = self._batch(i)
+        return af.tree, j
+
+    def __getitem__(self, i):
+        (_, frames), j = self._batch(i)
+        return frames[j]
+
+    def close(self):
+        for af, _ in self._opened.values():
+            af.close()
+        self._opened.clear()
+
+
+def _sequence_frames(tree, filepath):
+    """
+    Per-frame access to a MapSequence tree of any layout, including "parts".
+    """
+    if tree.get("layout") == "parts":
+        return _PartsFrames(tree, filepath)
+    return _tree_frames(tree)
+
+
+class LazyMapSequence:
+    """
+    Read-only, random-access view of a MapSequence stored in an ASDF file.
+
+    The file stays open: uncompressed arrays are memory-mapped and
+    compressed ones are decompressed only when their frame is requested
+    (in a compressed cube layout, each frame is its own block).
+    Each Map is built on first access and the most recently used
+    ``cache_size`` maps are kept. Slicing returns another LazyMapSequence
+    over the same open file, so taking a few frames out of a large file
+    reads nothing until those frames are used.
+
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, filepath, cache_size=8):
+        self._af = asdf.open(filepath, lazy_load=True, memmap=True)
+        tree = self._af.tree
+        if tree["type"] != "sunpy.map.MapSequence":
+            self._af.close()
+            raise TypeError(f"Not an ASDF MapSequence: {tree['type']}")
+        self._frames = _sequence_frames(tree, filepath)
+        self._indices = range(len(self._frames))
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def _view(self, indices):
+        view = object.__new__(LazyMapSequence)
+        view._af = self._af
+        view._frames = self._frames
+        view._indices = indices
+        view._cache = self._cache
+        view.cache_size = self.cache_size
+        return view
+
+    def _load(self, i):
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+        frame = self._frames[i]
+        smap = Map(_decode_array(frame["data"]), dict(frame["meta"]))
+        self._cache[i] = smap
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return smap
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._view(self._indices[key])
+        return self._load(self._indices[key])
+
+    def __iter__(self):
+        for i in self._indices:
+            yield self._load(i)
+
+    def as_mapsequence(self):
+        """
+        Build a regular MapSequence of every frame in this view.
+        """
+        return MapSequence([self._load(i) for i in self._indices], sortby=None)
+
+    def close(self):
+        self._cache.clear()
+        if isinstance(self._frames, _PartsFrames):
+            self._frames.close()
+        self._af.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@instrument('asdf_io')
+def read_asdf_map(filepath, lazy=False, cache_size=8):
     """
     Load a SunPy Map or MapSequence from an ASDF file.
 
+    The index written by AsdfMapWriter.close() is read by following its
+    batch files in ``<filepath>.parts/``.
+
     Parameters
     ----------
     filepath : str
         Path to the ASDF file.
+    lazy : bool, optional
+        If True, a MapSequence is returned as a LazyMapSequence that builds
+        each Map on access, and a single Map keeps its data memory-mapped
+        (uncompressed files only). Default: False
+    cache_size : int, optional
+        Number of decoded maps kept by a LazyMapSequence. Default: 8
 
     Returns
     -------
-    sunpy.map.GenericMap or sunpy.map.MapSequence
+    sunpy.map.GenericMap, sunpy.map.MapSequence or LazyMapSequence
         The loaded SunPy Map or MapSequence with full metadata.
     """
+    if lazy:
+        with asdf.open(filepath, lazy_load=True, memmap=True) as af:
+            if af.tree["type"] == "sunpy.map.GenericMap":
+                return Map(_decode_array(af.tree["data"]), af.tree["meta"])
+        return LazyMapSequence(filepath, cache_size=cache_size)
+
     with asdf.open(filepath) as af:
         tree = af.tree
 
-        if tree["type"] == "sunpy.map.MapSequence":
-            maps = [Map(np.array(m["data"]), m["meta"]) for m in tree["maps"]]
+        if tree["type"] == "sunpy.map.MapSequence" and tree.get("layout") == "cube":
+            cube = np.array(_decode_array(tree["data"]))
+            maps = [Map(cube[i], _frame_meta(tree["meta"], i)) for i in range(len(cube))]
+            return MapSequence(maps)
+        elif tree["type"] == "sunpy.map.MapSequence" and tree.get("layout") == "parts":
+            frames = _PartsFrames(tree, filepath)
+            try:
+                maps = [Map(np.array(_decode_array(frames[i]["data"])), dict(frames[i]["meta"]))
+                        for i in range(len(frames))]
+            finally:
+                frames.close()
+            return MapSequence(maps)
+        elif tree["type"] == "sunpy.map.MapSequence":
+            maps = [Map(np.array(_decode_array(m["data"])), m["meta"]) for m in tree["maps"]]
             return MapSequence(maps)
         elif tree["type"] == "sunpy.map.GenericMap":
-            return Map(np.array(tree["data"]), tree["meta"])
+            return Map(np.array(_decode_array(tree["data"])), tree["meta"])
+        else:
+            raise TypeError(f"Unknown ASDF map type: {tree['type']}")
+
+
+@instrument('asdf_io')
+def read_asdf_cube(filepath):
+    """
+    Load the frames of an ASDF MapSequence as one NumPy cube.
+
+    For the cube layout this is a single array read; list-layout files
+    and AsdfMapWriter batches are stacked frame by frame.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the ASDF file.
+
+    Returns
+    -------
+    cube : ndarray, shape (N, ny, nx)
+        Frame data in file order.
+    metas : list of dict
+        Metadata of every frame.
+    """
+    with asdf.open(filepath) as af:
+        tree = af.tree
+        if tree["type"] != "sunpy.map.MapSequence":
+            raise TypeError(f"Not an ASDF MapSequence: {tree['type']}")
+        if tree.get("layout") == "cube":
+            cube = np.array(_decode_array(tree["data"]))
+            metas = [_frame_meta(tree["meta"], i) for i in range(len(cube))]
+        elif tree.get("layout") == "parts":
+            frames = _PartsFrames(tree, filepath)
+            try:
+                cube, metas = None, []
+                for i in range(len(frames)):
+                    frame = frames[i]
+                    data = _decode_array(frame["data"])
+                    if cube is None:
+                        cube = np.empty((len(frames),) + data.shape, dtype=data.dtype)
+                    cube[i] = data
+                    metas.append(dict(frame["meta"]))
+            finally:
+                frames.close()
         else:
-            raise TypeError(f"Unknown ASDF map type: {tree['type']}")
\ No newline at end of file
+            cube = np.stack([_decode_array(m["data"]) for m in tree["maps"]])
+            metas = [dict(m["meta"]) for m in tree["maps"]]
+    return cube, metas
+
+
+
+def _frame_region(tree, index, key):
+    """
+    Data region ``key`` and metadata of frame ``index`` of a MapSequence tree.
+    """
+    if tree.get("layout") == "cube":
+        return _decode_array(tree["data"], (index,) + key), _frame_meta(tree["meta"], index)
+    frame = tree["maps"][index]
+    return _decode_array(frame["data"], key), dict(frame["meta"])
+
+
+@instrument('asdf_io')
+def read_asdf_roi(filepath, x_range, y_range, index=None):
+    """
+    Read a pixel region of a map stored in an ASDF file.
+
+    With tiled storage (save_asdf_map(..., tile_shape=...)) only the tiles
+    overlapping the region are decompressed.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the ASDF file.
+    x_range, y_range : tuple of int
+        (start, stop) pixel ranges along x (columns) and y (rows), stop exclusive.
+    index : int, optional
+        Frame number for MapSequence files.
+
+    Returns
+    -------
+    sunpy.map.GenericMap
+        The region as a Map, with CRPIX shifted to the cutout.
+    """
+    key = (slice(*y_range), slice(*x_range))
+    with asdf.open(filepath, lazy_load=True, memmap=True) as af:
+        tree = af.tree
+        if tree["type"] == "sunpy.map.GenericMap":
+            data, meta = np.array(_decode_array(tree["data"], key)), dict(tree["meta"])
+        elif index is None:
+            raise ValueError("index is required for a MapSequence file.")
+        elif tree.get("layout") == "parts":
+            frames = _PartsFrames(tree, filepath)
+            try:
+                data, meta = _frame_region(*frames.locate(index), key)
+                data = np.array(data)
+            finally:
+                frames.close()
+        else:
+            data, meta = _frame_region(tree, index, key)
+            data = np.array(data)
+
+    meta["crpix1"] = meta["crpix1"] - x_range[0]
+    meta["crpix2"] = meta["crpix2"] - y_range[0]
+    meta["naxis1"], meta["naxis2"] = data.shape[1], data.shape[0]
+    return Map(data, meta)
@@ -1,35 +1,46 @@
 from astropy import units as u
-from sunpy.map import Map
+from sunpy.map import Map, MapSequence
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import lru_cache
 import numpy as np
+import itertools
+import os
+try:
+    from .instrument import instrument
+except ImportError:  # imported as a top-level module
+    from instrument import instrument
 
-def sun_register(smap,res=0.7* u.arcsec / u.pix, recenter=True, missing=None, order=3, method='scipy', clip=True):
+@lru_cache(maxsize=256)
+def _scale_factor(map_scale, res):
     """
-    Co-registers observations with differet plate scale. Uses SunPy Map rotate function.
-    smap: SunPy Mapsequence.
-    res: Required resolution of the output maps. Default value: 0.7
-    missing: Value to replace the empty array values. Default value: 0
-    order: Default order of interpolation. Default order: 3
-    method: Interpolation method to use. Default: 'scipy'
+    Scale decision of sun_register for a plate scale and target resolution
+    (both in arcsec/pix), made once per unique pair.
     """
-
-    [x_shp, y_shp] = smap.data.shape
-
-    if((smap.scale[0] / res).round() != 1.0 * u.arcsec / u.pix):
-        if(smap.scale[0]/res>0.5):
-            scale = (smap.scale[0] / res).round() * res * u.arcsec
+    map_scale = map_scale * u.arcsec / u.pix
+    res = res * u.arcsec / u.pix
+    if((map_scale / res).round() != 1.0 * u.arcsec / u.pix):
+        if(map_scale/res>0.5):
+            scale = (map_scale / res).round() * res * u.arcsec
         else:
-            scale = (smap.scale[0]/res) * u.arcsec
+            scale = (map_scale/res) * u.arcsec
     else:
         scale = res * u.arcsec
 
-    scale_factor = smap.scale[0] / scale
+    return (map_scale / scale).value
+
+
+def _register(smap, scale_factor, missing=None, order=3, method='scipy', clip=True):
+    """
+    Rotate/rescale one map with a precomputed scale factor (see sun_register).
+    """
+    [x_shp, y_shp] = smap.data.shape
+
     missing = smap.min() if missing is None else missing
-    tempmap = smap.rotate(recenter=True,scale=scale_factor.value,order=order,missing=missing,method=method,clip=clip)
+    tempmap = smap.rotate(recenter=True,scale=scale_factor,order=order,missing=missing,method=method,clip=clip)
     center = np.floor(tempmap.meta["crpix1"])
 
 
     if(tempmap.data.shape[0]>x_shp):
-        print('Here !!')
         range_side = (center + np.array([-1, 1]) * smap.data.shape[0] / 2) * u.pix
         newmap = tempmap.submap(u.Quantity([range_side[0], range_side[0]]),top_right=u.Quantity([range_side[1], range_side[1]]) - 1 * u.pix,)
     else:
@@ -42,3 +53,281 @@ def sun_register(smap,res=0.7* u.arcsec / u.pix, recenter=True, missing=None, or
         return newmap
 
 
+# Extra input pixels read around a window's footprint so that the spline
+# prefilter of scipy.ndimage sees the same neighbourhood as on the full image
+_SPLINE_MARGIN = 32
+
+
+def _rotate_geometry(smap, scale_factor):
+    """
+    The transform GenericMap.rotate(recenter=True, scale=scale_factor) applies.
+
+    Mirrors the padding, matrix and header arithmetic of sunpy's rotate so
+    that any output pixel can be computed without rotating the whole image.
+    """
+    rmatrix = smap.rotation_matrix
+    inv_rmatrix = np.linalg.inv(rmatrix)
+    ny, nx = smap.data.shape
+
+    corners = itertools.product([-0.5, nx-0.5], [-0.5, ny-0.5])
+    rot_corners = np.vstack([rmatrix @ c for c in corners]) * scale_factor
+    extent = np.max(rot_corners, axis=0) - np.min(rot_corners, axis=0)
+    diff = np.asarray(np.ceil((extent - np.array([nx, ny])) / 2), dtype=int)
+    pad_x, pad_y = max(diff[0], 0), max(diff[1], 0)
+    unpad_x, unpad_y = -min(diff[0], 0), -min(diff[1], 0)
+
+    padded_shape = (ny + 2*pad_y, nx + 2*pad_x)
+    pixel_array_center = (np.array(padded_shape[::-1]) - 1) / 2.0
+    pixel_rotation_center = u.Quantity(smap.reference_pixel).value + [pad_x, pad_y]
+
+    # sunpy.image.transform.affine_transform with recenter=True
+    matrix = inv_rmatrix / scale_factor
+    shift = pixel_rotation_center - matrix @ pixel_array_center
+
+    lon, lat = smap._get_lon_lat(smap.reference_coordinate.frame)
+    meta = smap.meta.copy()
+    meta['crval1'] = lon.value
+    meta['crval2'] = lat.value
+    meta['crpix1'] = pixel_array_center[0] + 1 - unpad_x
+    meta['crpix2'] = pixel_array_center[1] + 1 - unpad_y
+    meta['NAXIS1'] = padded_shape[1] - 2*unpad_x
+    meta['NAXIS2'] = padded_shape[0] - 2*unpad_y
+    pc_C = np.dot(smap.rotation_matrix, inv_rmatrix)
+    meta['PC1_1'] = pc_C[0, 0]
+    meta['PC1_2'] = pc_C[0, 1]
+    meta['PC2_1'] = pc_C[1, 0]
+    meta['PC2_2'] = pc_C[1, 1]
+    if scale_factor != 1.0:
+        meta['cdelt1'] = (smap.scale[0] / scale_factor).value
+        meta['cdelt2'] = (smap.scale[1] / scale_factor).value
+    for key in ('CROTA1', 'CROTA2', 'CD1_1', 'CD1_2', 'CD2_1', 'CD2_2'):
+        meta.pop(key, None)
+
+    return {
+        'matrix': matrix, 'shift': shift, 'pad': (pad_x, pad_y),
+        'padded_shape': padded_shape, 'offset': (unpad_x, unpad_y),
+        'shape': (meta['NAXIS2'], meta['NAXIS1']), 'meta': meta,
+    }
+
+
+def _pixel_box(meta, shape, *submap_args, **submap_kwargs):
+    """
+    Pixel offset, shape and header of a submap, without touching any data.
+
+    The submap is taken of zero-cost broadcast index images, so the cutout
+    is exactly the one GenericMap.submap would choose.
+    """
+    ny, nx = shape
+    xs = Map(np.broadcast_to(np.arange(nx, dtype=float), shape), meta).submap(*submap_args, **submap_kwargs)
+    ys = Map(np.broadcast_to(np.arange(ny, dtype=float)[:, None], shape), meta).submap(*submap_args, **submap_kwargs)
+    return (int(xs.data[0, 0]), int(ys.data[0, 0])), xs.data.shape, xs.meta
+
+
+def _register_window(smap, scale_factor, window, missing=None, order=3, clip=True):
+    """
+    sun_register restricted to an output window (scipy method only).
+
+    Only the input pixels under the window's footprint are interpolated,
+    so the cost scales with the window size, not the full-disk size.
+    """
+    from scipy.ndimage import affine_transform
+    from scipy.signal import convolve2d
+
+    [x_shp, y_shp] = smap.data.shape
+    data = smap.data
+    missing = smap.min() if missing is None else missing
+    geo = _rotate_geometry(smap, scale_factor)
+    meta, shape = geo['meta'], geo['shape']
+    ox, oy = geo['offset']
+
+    # Same cutout as _register when the rotated image outgrows the input
+    if(shape[0]>x_shp):
+        center = np.floor(meta["crpix1"])
+        range_side = (center + np.array([-1, 1]) * x_shp / 2) * u.pix
+        (cx, cy), shape, meta = _pixel_box(
+            meta, shape, u.Quantity([range_side[0], range_side[0]]),
+            top_right=u.Quantity([range_side[1], range_side[1]]) - 1 * u.pix)
+        ox, oy = ox + cx, oy + cy
+    if "rsun_obs" in meta:
+        meta["r_sun"] = meta["rsun_obs"] / meta["cdelt1"]
+
+    bottom_left, top_right = window
+    (wx, wy), shape, meta = _pixel_box(meta, shape, bottom_left, top_right=top_right)
+    ox, oy = ox + wx, oy + wy
+    wny, wnx = shape
+
+    # Footprint of the window in the padded input image, plus spline margin
+    matrix, pad_x, pad_y = geo['matrix'], *geo['pad']
+    out_corners = np.array([[ox, oy], [ox + wnx - 1, oy], [ox, oy + wny - 1], [ox + wnx - 1, oy + wny - 1]], dtype=float)
+    in_corners = out_corners @ matrix.T + geo['shift']
+    margin = _SPLINE_MARGIN if order > 1 else 2
+    pny, pnx = geo['padded_shape']
+    x0 = int(np.clip(np.floor(in_corners[:, 0].min()) - margin, 0, pnx))
+    x1 = int(np.clip(np.ceil(in_corners[:, 0].max()) + margin + 1, 0, pnx))
+    y0 = int(np.clip(np.floor(in_corners[:, 1].min()) - margin, 0, pny))
+    y1 = int(np.clip(np.ceil(in_corners[:, 1].max()) + margin + 1, 0, pny))
+
+    # Crop of the padded image: data where it overlaps, `missing` elsewhere
+    crop = np.full((max(y1 - y0, 1), max(x1 - x0, 1)), missing, dtype=np.result_type(data.dtype, np.asarray(missing).dtype, np.float32))
+    sy0, sy1 = max(y0 - pad_y, 0), min(y1 - pad_y, y_shp)
+    sx0, sx1 = max(x0 - pad_x, 0), min(x1 - pad_x, x_shp)
+    if sy1 > sy0 and sx1 > sx0:
+        crop[sy0 + pad_y - y0:sy1 + pad_y - y0, sx0 + pad_x - x0:sx1 + pad_x - x0] = data[sy0:sy1, sx0:sx1]
+
+    # NaNs in the image are handled as in sunpy.image.transform
+    isnan = np.isnan(crop)
+    has_nans = isnan.any()
+    if has_nans:
+        n_pad = geo['padded_shape'][0] * geo['padded_shape'][1] - data.size
+        substitute = np.nanmedian(np.concatenate([np.ravel(data), np.full(n_pad, missing)]))
+        crop = np.nan_to_num(crop, nan=substitute)
+
+    offset = matrix @ np.array([ox, oy]) + geo['shift'] - np.array([x0, y0])
+    out = affine_transform(crop.T, matrix, offset=offset, output_shape=(wnx, wny), order=order,
+                           mode='constant', cval=missing).T
+
+    if has_nans:
+        sizes = [1, 1, 5, 5, 7, 7]
+        expanded = convolve2d(isnan.astype(float), np.ones((sizes[order], sizes[order])), mode='same')
+        rotated_nans = affine_transform(expanded.T, matrix, offset=offset, output_shape=(wnx, wny),
+                                        order=min(order, 1), mode='constant', cval=0).T
+        out[rotated_nans > 0] = np.nan
+
+    if clip:
+        lo, hi = np.nanmin(data), np.nanmax(data)
+        if np.isnan(missing):
+            out.clip(lo, hi, out=out)
+        else:
+            # Outside the input (padding or rotated-in corners) the full
+            # output holds `missing`, so it is part of the clipping range
+            out.clip(min(lo, missing), max(hi, missing), out=out)
+
+    return smap._new_instance(out, meta, smap.plot_settings)
+
+
+def _register_scaled(smap, scale_factor, missing, order, method, clip, window):
+    if window is None:
+        return _register(smap, scale_factor, missing=missing, order=order, method=method, clip=clip)
+    if method == 'scipy':
+        return _register_window(smap, scale_factor, window, missing=missing, order=order, clip=clip)
+    newmap = _register(smap, scale_factor, missing=missing, order=order, method=method, clip=clip)
+    return newmap.submap(window[0], top_right=window[1])
+
+
+def _register_item(item, res, missing, order, method, clip, window=None, cache=None):
+    """
+    Worker entry point of sun_register_sequence: item is a map or a file path.
+    """
+    smap = Map(item) if isinstance(item, (str, os.PathLike)) else item
+    if cache is not None:
+        key = cache.key(smap, res=res, missing=missing, order=order, method=method,
+                        clip=clip, window=window)
+        newmap = cache.get(key)
+        if newmap is not None:
+            return newmap
+    scale_factor = _scale_factor(smap.scale[0].to_value(u.arcsec / u.pix), res)
+    newmap = _register_scaled(smap, scale_factor, missing, order, method, clip, window)
+    if cache is not None:
+        cache.put(key, newmap)
+    return newmap
+
+
+def _register_item_counted(item, res, missing, order, method, clip, window, cache):
+    """
+    _register_item in a worker process; also returns the changes of the worker's
+    copy of the cache counters, for the parent to add to its cache.
+    """
+    if cache is None:
+        return _register_item(item, res, missing, order, method, clip, window), None
+    before = cache._counts()
+    newmap = _register_item(item, res, missing, order, method, clip, window, cache)
+    return newmap, tuple(after - b for after, b in zip(cache._counts(), before))
+
+
+@instrument('register')
+def sun_register(smap,res=0.7* u.arcsec / u.pix, recenter=True, missing=None, order=3, method='scipy', clip=True, window=None, cache=None):
+    """
+    Co-registers observations with differet plate scale. Uses SunPy Map rotate function.
+    smap: SunPy Map. Use sun_register_sequence for a MapSequence.
+    res: Required resolution of the output maps. Default value: 0.7
+    missing: Value to replace the empty array values. Default value: 0
+    order: Default order of interpolation. Default order: 3
+    method: Interpolation method to use. Default: 'scipy'
+    window: Optional (bottom_left, top_right) of the output region, as SkyCoords or as pixel
+        Quantities in the registered map (the arguments of GenericMap.submap). Only the pixels
+        inside the window are interpolated; the result matches sun_register(...).submap(*window).
+        Requires method='scipy'; other methods fall back to the full registration.
+    cache: Optional RegistrationCache (register_cache). A call with the same data, header and
+        parameters as a cached one is read back from disk instead of interpolated again.
+    """
+    return _register_item(smap, res.to_value(u.arcsec / u.pix), missing, order, method, clip, window, cache)
+
+
+@instrument('register')
+def sun_register_sequence(maps, res=0.7* u.arcsec / u.pix, recenter=True, missing=None, order=3,
+                          method='scipy', clip=True, window=None, cache=None, workers=None,
+                          max_in_flight=None, callback=None):
+    """
+    Co-registers every map of a sequence with sun_register, in parallel.
+    maps: SunPy MapSequence, or an iterable of maps or FITS file paths (paths are read in the workers).
+    res, missing, order, method, clip, window, cache: As for sun_register. A pixel window is the same
+        pixel box in every frame; give SkyCoords to follow a fixed solar (Tx, Ty) region.
+    workers: Number of worker processes. Default: os.cpu_count(). 1 runs in this process.
+    max_in_flight: Maximum number of maps submitted but not yet returned, which bounds the
+        memory held at once. Default: 2 * workers
+    callback: Optional function called as callback(i, registered_map) in input order. When
+        given, results are streamed to it and not kept, and None is returned.
+
+    The scale decision is made once per unique (plate scale, res) pair and memoised in every
+    worker, so frames sharing a plate scale do not repeat it.
+
+    Returns a new MapSequence in input order (or None with a callback).
+    """
+    res = res.to_value(u.arcsec / u.pix)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    registered = []
+
+    def emit(i, newmap):
+        if callback is None:
+            registered.append(newmap)
+        else:
+            callback(i, newmap)
+
+    if workers == 1:
+        for i, item in enumerate(maps):
+            emit(i, _register_item(item, res, missing, order, method, clip, window, cache))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            items = enumerate(maps)
+            pending, done = {}, {}
+            next_out = 0
+
+            def submit_next():
+                for i, item in items:
+                    pending[pool.submit(_register_item_counted, item, res, missing, order, method, clip,
+                                        window, cache)] = i
+                    return True
+                return False
+
+            while len(pending) < max_in_flight and submit_next():
+                pass
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    newmap, counts = future.result()
+                    if counts is not None:
+                        cache._add_counts(counts)
+                    done[pending.pop(future)] = newmap
+                # Emit in input order; hold back results that finished early
+                while next_out in done:
+                    emit(next_out, done.pop(next_out))
+                    next_out += 1
+                # Results held back out of order count against the budget too
+                while len(pending) + len(done) < max_in_flight and submit_next():
+                    pass
+
+    if callback is not None:
+        return None
+    return MapSequence(registered, sortby=None)
@@ -0,0 +1,150 @@
+import os, hashlib, uuid
+import numpy as np
+
+from .read_save_map import save_asdf_map, read_asdf_map
+
+
+class RegistrationCache:
+    """
+    Content-addressed on-disk cache of registered maps.
+
+    Entries are keyed by a sha256 of the input data, its header and every
+    registration parameter, and stored as one ASDF file per entry. A hit
+    refreshes the file's mtime; once the cache holds more than ``max_bytes``
+    the least recently used entries are deleted. Several processes may share
+    a directory: entries are written to a temporary name and renamed.
+
+    Parameters
+    ----------
+    directory : str
+        Cache directory; created if missing.
+    max_bytes : int, optional
+        Size limit of the cache. Default: 10 GiB
+    compress : bool or str, optional
+        Block compression of the entries, as for save_asdf_map. Default: False
+        (uncompressed entries load fastest).
+
+    Pass the cache as ``cache=`` to sun_register or sun_register_sequence.
+    The counts in ``stats`` include the lookups that sun_register_sequence
+    makes in its worker processes, which are reported back to this object.
+    """
+
+    def __init__(self, directory, max_bytes=10 * 2**30, compress=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(smap, **params):
+        """
+        Hash of the map data, its header and the registration parameters.
+        """
+        digest = hashlib.sha256()
+        data = np.ascontiguousarray(smap.data)
+        digest.update(f"{data.dtype.str}{data.shape}".encode())
+        digest.update(memoryview(data).cast('B'))
+        meta = sorted((str(k), repr(v)) for k, v in smap.meta.items())
+        digest.update(repr(meta).encode())
+        digest.update(repr(sorted((k, repr(v)) for k, v in params.items())).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.asdf')
+
+    def get(self, key):
+        """
+        Return the cached map for key, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            smap = read_asdf_map(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            # Missing, or evicted/truncated by another process meanwhile
+            self.misses += 1
+            return None
+        self.hits += 1
+        return smap
+
+    def put(self, key, smap):
+        """
+        Store a registered map and evict old entries beyond max_bytes.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            save_asdf_map(smap, filename=tmp_path, compress=self.compress)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep=path)
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.asdf'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        """
+        Total size of the cache entries in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """
+        Delete least recently used entries until the cache fits in max_bytes.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def _counts(self):
+        return self.hits, self.misses, self.evictions
+
+    def _add_counts(self, counts):
+        """
+        Add counter changes made by a copy of this cache in a worker process.
+        """
+        hits, misses, evictions = counts
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def clear(self):
+        for _, _, path in self._entries():
+            os.remove(path)
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else float('nan'),
+            'bytes': self.size(),
+        }
+
+    def __len__(self):
+        return len(self._entries())
@@ -0,0 +1,245 @@
+import os, glob, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+from astropy.io import fits
+
+try:
+    from .correct_suvi_header import read_suvi_l1b, _decompressed_path
+    from .suvi_restore_dn import suvi_index_from_map, suvi_restore_dn
+except ImportError:  # run as a script: python suvi_pipeline.py INPUTS OUT_DIR
+    from correct_suvi_header import read_suvi_l1b, _decompressed_path
+    from suvi_restore_dn import suvi_index_from_map, suvi_restore_dn
+
+STAGES = ('header', 'index', 'restore', 'write')
+
+
+def _list_inputs(inputs):
+    """
+    Expand a directory, a glob pattern or a list of paths into sorted files.
+    """
+    if isinstance(inputs, (str, os.PathLike)):
+        inputs = str(inputs)
+        if os.path.isdir(inputs):
+            inputs = os.path.join(inputs, '*.fits*')
+        return sorted(p for p in glob.glob(inputs, recursive=True) if os.path.isfile(p))
+    return sorted(str(p) for p in inputs)
+
+
+def _output_name(in_filename, out_dir):
+    base = os.path.basename(in_filename)
+    for ext in ('.gz', '.fits', '.fts'):
+        if base.endswith(ext):
+            base = base[:-len(ext)]
+    return os.path.join(out_dir, base + '_dn.fits')
+
+
+def _load_state(state_file):
+    """
+    Return the set of inputs recorded as completed in the state file.
+    """
+    done = set()
+    if not os.path.exists(state_file):
+        return done
+    with open(state_file) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Partial last line from a killed run
+                continue
+            if os.path.exists(entry['output']):
+                done.add(entry['input'])
+    return done
+
+
+def _process_file(in_filename, out_filename, dtype, chunk_rows, approx_camera_noise,
+                  decompress_dir):
+    """
+    Run header fix → index → DN restoration → write for one file.
+
+    Runs in a worker process. Peak memory is the two output frames plus one
+    row tile of the memory-mapped input. With decompress_dir, the
+    decompressed copy of a gzip'd input is deleted once the file is done.
+    """
+    timings = {}
+    try:
+        t0 = time.perf_counter()
+        suvi_map = read_suvi_l1b(in_filename, decompress_dir=decompress_dir)
+        t1 = time.perf_counter()
+        timings['header'] = t1 - t0
+
+        index = suvi_index_from_map(suvi_map)
+        t2 = time.perf_counter()
+        timings['index'] = t2 - t1
+
+        out_dn, error_estimate, response = suvi_restore_dn(
+            suvi_map.data, index, approx_camera_noise=approx_camera_noise,
+            dtype=dtype, chunk_rows=chunk_rows
+        )
+        t3 = time.perf_counter()
+        timings['restore'] = t3 - t2
+
+        hdr = suvi_map.fits_header
+        hdr['BUNIT'] = 'DN'
+        hdr['HISTORY'] = 'Restored to DN with suvi_restore_dn'
+        err_hdr = fits.Header()
+        err_hdr['BUNIT'] = 'DN'
+        tmp_filename = out_filename + '.part'
+        fits.HDUList([
+            fits.PrimaryHDU(out_dn, header=hdr),
+            fits.ImageHDU(error_estimate, header=err_hdr, name='ERROR'),
+        ]).writeto(tmp_filename, overwrite=True)
+        os.replace(tmp_filename, out_filename)
+        timings['write'] = time.perf_counter() - t3
+    finally:
+        if decompress_dir is not None:
+            # Release the memory map before deleting the file it maps
+            suvi_map = None
+            raw_filename = _decompressed_path(in_filename, decompress_dir)
+            if os.path.exists(raw_filename):
+                os.remove(raw_filename)
+
+    return timings
+
+
+def run_suvi_pipeline(inputs, out_dir, state_file=None, workers=None,
+                      dtype=np.float32, chunk_rows=256, approx_camera_noise=1.0,
+                      decompress_dir=None, verbose=True):
+    """
+    Convert a directory of SUVI L1b files to DN and error images.
+
+    Every file goes through read_suvi_l1b (header repair, memory-mapped
+    data), suvi_index_from_map and a row-tiled suvi_restore_dn, and is
+    written as <name>_dn.fits with the DN image in the primary HDU and the
+    error estimate in an 'ERROR' extension. Files run in parallel on a
+    process pool. Completed inputs are appended to a JSON-lines state file,
+    so rerunning after an interruption skips finished work.
+
+    Parameters
+    ----------
+    inputs : str or list of str
+        Directory (all *.fits* files in it), glob pattern or list of files.
+    out_dir : str
+        Output directory; created if missing.
+    state_file : str, optional
+        Resume file. Default: <out_dir>/suvi_pipeline_state.jsonl
+    workers : int, optional
+        Number of worker processes. Default: os.cpu_count().
+    dtype : dtype, optional
+        Output dtype. Default: np.float32
+    chunk_rows : int or None, optional
+        Row tile size for suvi_restore_dn; bounds the memory of each worker.
+    approx_camera_noise : float, optional
+        Camera noise in DN passed to suvi_restore_dn.
+    decompress_dir : str, optional
+        Passed to read_suvi_l1b for gzip'd inputs.
+    verbose : bool, optional
+        Print the throughput summary.
+
+    Returns
+    -------
+    dict
+        'processed', 'skipped' and 'failed' counts, 'failures' (input → error
+        message), 'stages' with the summed seconds and frames/s of every stage
+        (per worker), and 'frames_per_s' over the wall-clock time.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if state_file is None:
+        state_file = os.path.join(out_dir, 'suvi_pipeline_state.jsonl')
+    workers = workers or os.cpu_count() or 1
+
+    files = _list_inputs(inputs)
+    done = _load_state(state_file)
+    todo = [f for f in files if f not in done]
+
+    stage_seconds = dict.fromkeys(STAGES, 0.0)
+    failures = {}
+    processed = 0
+
+    t_start = time.perf_counter()
+    with open(state_file, 'a') as state, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        queue = iter(todo)
+
+        def submit_next():
+            for in_filename in queue:
+                out_filename = _output_name(in_filename, out_dir)
+                future = pool.submit(
+                    _process_file, in_filename, out_filename, dtype, chunk_rows,
+                    approx_camera_noise, decompress_dir
+                )
+                pending[future] = (in_filename, out_filename)
+                return
+
+        # Keep at most two tasks per worker in flight
+        for _ in range(2 * workers):
+            submit_next()
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                in_filename, out_filename = pending.pop(future)
+                try:
+                    timings = future.result()
+                except Exception as e:
+                    failures[in_filename] = f"{type(e).__name__}: {e}"
+                else:
+                    processed += 1
+                    for stage, seconds in timings.items():
+                        stage_seconds[stage] += seconds
+                    state.write(json.dumps({
+                        'input': in_filename, 'output': out_filename,
+                        'timings': timings,
+                    }) + '\n')
+                    state.flush()
+                submit_next()
+    wall = time.perf_counter() - t_start
+
+    report = {
+        'processed': processed,
+        'skipped': len(files) - len(todo),
+        'failed': len(failures),
+        'failures': failures,
+        'stages': {
+            stage: {
+                'seconds': seconds,
+                'frames_per_s': processed / seconds if seconds > 0 else float('nan'),
+            }
+            for stage, seconds in stage_seconds.items()
+        },
+        'wall_seconds': wall,
+        'frames_per_s': processed / wall if wall > 0 else float('nan'),
+    }
+
+    if verbose:
+        print(f"Processed {processed}, skipped {report['skipped']}, "
+              f"failed {report['failed']} in {wall:.1f} s "
+              f"({report['frames_per_s']:.2f} frames/s)")
+        for stage, stats in report['stages'].items():
+            print(f"  {stage:8s} {stats['frames_per_s']:10.2f} frames/s per worker")
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert SUVI L1b files to DN and error images."
+    )
+    parser.add_argument('inputs', help="Input directory or glob pattern")
+    parser.add_argument('out_dir', help="Output directory")
+    parser.add_argument('--state-file', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-rows', type=int, default=256)
+    parser.add_argument('--float64', action='store_true',
+                        help="Write float64 instead of float32 output")
+    parser.add_argument('--decompress-dir', default=None)
+    args = parser.parse_args()
+
+    run_suvi_pipeline(
+        args.inputs, args.out_dir, state_file=args.state_file,
+        workers=args.workers, chunk_rows=args.chunk_rows,
+        dtype=np.float64 if args.float64 else np.float32,
+        decompress_dir=args.decompress_dir
+    )
@@ -1,5 +1,10 @@
 from dataclasses import dataclass
+from functools import lru_cache
 import numpy as np
+try:
+    from .instrument import instrument
+except ImportError:  # imported as a top-level module
+    from instrument import instrument
 
 @dataclass
 class SuviIndex:
@@ -7,6 +12,7 @@ class SuviIndex:
     filter1: str
     filter2: str
     ccd_tmp1: float
+@instrument('index')
 def suvi_index_from_map(suvi_map):
     """
     Construct a SUVI index object from a SunPy Map or FITS header.
@@ -49,6 +55,90 @@ def suvi_index_from_map(suvi_map):
     )
 
 
+# --- Calibration constants (built once at import) ---
+_WVLNS_STR = ['94 A', '131 A', '171 A', '195 A', '284 A', '304 A']
+_WVLNS_INT = [94, 131, 171, 195, 284, 304]
+
+_FW1_NAMES = ['Open', 'Thin_Al', 'Thin_Zr', 'Thick_Zr', 'Thick_Al']
+_FW2_NAMES = ['Glass', 'Open', 'Thin_Al', 'Thin_Zr', 'Thick_Al']
+
+_GEOM_AREA = 0.001936            # m^2
+_SOLID_ANGLE = 1.46903e-10       # sr
+
+_M1_REFLECTIVITY = np.array([0.3249, 0.6615, 0.4833, 0.3615, 0.2415, 0.2264])
+_M2_REFLECTIVITY = np.array([0.2452, 0.6171, 0.4459, 0.3302, 0.2193, 0.2103])
+_ENT_TRANS = np.array([0.3655, 0.3289, 0.5392, 0.5323, 0.3907, 0.3645])
+
+_FW1_TRANS = np.array([
+    [1.0, 5.951421e-03, 3.67894e-01, 2.64501197e-01, 4.31837e-04],
+    [1.0, 8.200625e-03, 3.30119966e-01, 2.35383536e-01, 7.26064e-04],
+    [1.0, 5.34282080e-01, 1.66932636e-01, 9.02533750e-02, 4.67286276e-01],
+    [1.0, 5.29553176e-01, 4.24509360e-02, 1.23050400e-02, 4.71508674e-01],
+    [1.0, 3.85627244e-01, 1.58321e-10, 4.64234e-15, 3.18311852e-01],
+    [1.0, 3.63653942e-01, 1.9698e-12, 7.21305e-18, 2.97853032e-01],
+])
+
+_FW2_TRANS = np.array([
+    [0.0, 1.0, 7.034442e-03, 3.66690547e-01, 4.03902e-04],
+    [0.0, 1.0, 9.570788e-03, 3.29012990e-01, 6.8255e-04],
+    [0.0, 1.0, 5.38863752e-01, 1.65916294e-01, 4.65692969e-01],
+    [0.0, 1.0, 5.33485838e-01, 4.19321e-02, 4.70115272e-01],
+    [0.0, 1.0, 3.90370926e-01, 1.42733e-10, 3.16758959e-01],
+    [0.0, 1.0, 3.68309497e-01, 1.73955e-12, 2.96341297e-01],
+])
+
+_CCD_QE_LIST = np.array([0.5255, 0.872, 0.8256, 0.8093, 0.7676, 0.7575])
+
+_PHOT_ELEC_CONVERSION = np.array([36.17, 25.89, 19.85, 17.41, 11.95, 11.18])
+_PHOT_ENERGY = np.array([
+    2.12e-17, 1.51e-17, 1.16e-17,
+    1.02e-17, 6.99e-18, 6.54e-18
+])
+
+_CCD_GAIN_TEMP_ARRAY = np.array([
+    -88.93333333, -87.91666667, -86.9, -86.02142857, -85.14285714,
+    -84.26428571, -83.38571429, -82.50714286, -81.62857143, -80.75,
+    -79.87142857, -78.99285714, -78.11428571, -77.23571429, -76.35714286,
+    -75.05555556, -74.6, -73.65384615, -72.70769231, -71.76153846,
+    -70.81538462, -69.86923077, -68.92307692, -67.97692308, -67.03076923,
+    -66.08461538, -65.13846154, -64.19230769, -63.2, -62.3,
+    -61.34615385, -60.39230769, -59.43846154, -58.48461538, -57.53076923,
+    -56.57692308, -55.62307692, -54.66923077, -53.71538462, -52.76153846,
+    -51.388, -50.396, -49.9, -48.86666667, -47.83333333, -46.8,
+    -45.76666667, -44.73333333, -43.7, -42.66666667, -41.63333333,
+    -40.6, -39.56666667, -38.944, -37.5, -36.53846154,
+    -35.57692308, -34.61538462, -33.65384615, -32.69230769, -31.73076923
+])
+
+_CCD_GAIN = np.array([
+    35.42917853, 35.47891651, 35.52865449, 35.57163649, 35.61461849,
+    35.6576005, 35.7005825, 35.7435645, 35.7865465, 35.8295285,
+    35.8725105, 35.9154925, 35.95847451, 36.00145651, 36.04443851,
+    36.10811555, 36.13040251, 36.17669082, 36.22297913, 36.26926744,
+    36.31555575, 36.36184406, 36.40813237, 36.45442068, 36.50070899,
+    36.5469973, 36.5932856, 36.63957391, 36.68812019, 36.73215053,
+    36.77881517, 36.82547981, 36.87214444, 36.91880908, 36.96547372,
+    37.01213835, 37.05880299, 37.10546763, 37.15213226, 37.1987969,
+    37.26599398, 37.3145252, 37.33879081, 37.38934417, 37.43989753,
+    37.49045088, 37.54100424, 37.5915576, 37.64211095, 37.69266431,
+    37.74321767, 37.79377102, 37.84432438, 37.87478685, 37.94543109,
+    37.99247206, 38.03951302, 38.08655399, 38.13359495, 38.18063592,
+    38.22767688
+])
+
+for _arr in (_M1_REFLECTIVITY, _M2_REFLECTIVITY, _ENT_TRANS, _FW1_TRANS,
+             _FW2_TRANS, _CCD_QE_LIST, _PHOT_ELEC_CONVERSION, _PHOT_ENERGY,
+             _CCD_GAIN_TEMP_ARRAY, _CCD_GAIN):
+    _arr.flags.writeable = False
+del _arr
+
+# Default CCD temperature quantum (deg C) for the batch response cache.
+# The cached response differs from the exact one by ~6.6e-4 per deg C of
+# rounding, so 1e-4 deg C stays within float32 precision (~6.6e-8), while
+# frames whose header temperatures agree still share one entry.
+CCD_TEMP_STEP = 1e-4
+
+
 def suvi_approx_response(wvln, fw1, fw2, ccd_temp):
     """
     Python translation of IDL suvi_approx_response.pro
@@ -71,113 +161,72 @@ def suvi_approx_response(wvln, fw1, fw2, ccd_temp):
     """
 
     # --- Wavelength handling (IDL var_type logic) ---
-    if isinstance(wvln, str):
-        wvlns = ['94 A', '131 A', '171 A', '195 A', '284 A', '304 A']
-    else:
-        wvlns = [94, 131, 171, 195, 284, 304]
-
-    fw1_names = ['Open', 'Thin_Al', 'Thin_Zr', 'Thick_Zr', 'Thick_Al']
-    fw2_names = ['Glass', 'Open', 'Thin_Al', 'Thin_Zr', 'Thick_Al']
-
-    # --- Constants ---
-    geom_area = 0.001936            # m^2
-    solid_angle = 1.46903e-10       # sr
-
-    m1_reflectivity = np.array([0.3249, 0.6615, 0.4833, 0.3615, 0.2415, 0.2264])
-    m2_reflectivity = np.array([0.2452, 0.6171, 0.4459, 0.3302, 0.2193, 0.2103])
-    ent_trans = np.array([0.3655, 0.3289, 0.5392, 0.5323, 0.3907, 0.3645])
-
-    fw1_trans = np.array([
-        [1.0, 5.951421e-03, 3.67894e-01, 2.64501197e-01, 4.31837e-04],
-        [1.0, 8.200625e-03, 3.30119966e-01, 2.35383536e-01, 7.26064e-04],
-        [1.0, 5.34282080e-01, 1.66932636e-01, 9.02533750e-02, 4.67286276e-01],
-        [1.0, 5.29553176e-01, 4.24509360e-02, 1.23050400e-02, 4.71508674e-01],
-        [1.0, 3.85627244e-01, 1.58321e-10, 4.64234e-15, 3.18311852e-01],
-        [1.0, 3.63653942e-01, 1.9698e-12, 7.21305e-18, 2.97853032e-01],
-    ])
-
-    fw2_trans = np.array([
-        [0.0, 1.0, 7.034442e-03, 3.66690547e-01, 4.03902e-04],
-        [0.0, 1.0, 9.570788e-03, 3.29012990e-01, 6.8255e-04],
-        [0.0, 1.0, 5.38863752e-01, 1.65916294e-01, 4.65692969e-01],
-        [0.0, 1.0, 5.33485838e-01, 4.19321e-02, 4.70115272e-01],
-        [0.0, 1.0, 3.90370926e-01, 1.42733e-10, 3.16758959e-01],
-        [0.0, 1.0, 3.68309497e-01, 1.73955e-12, 2.96341297e-01],
-    ])
-
-    ccd_qe_list = np.array([0.5255, 0.872, 0.8256, 0.8093, 0.7676, 0.7575])
-
-    phot_elec_conversion = np.array([36.17, 25.89, 19.85, 17.41, 11.95, 11.18])
-    phot_energy = np.array([
-        2.12e-17, 1.51e-17, 1.16e-17,
-        1.02e-17, 6.99e-18, 6.54e-18
-    ])
-
-    ccd_gain_temp_array = np.array([
-        -88.93333333, -87.91666667, -86.9, -86.02142857, -85.14285714,
-        -84.26428571, -83.38571429, -82.50714286, -81.62857143, -80.75,
-        -79.87142857, -78.99285714, -78.11428571, -77.23571429, -76.35714286,
-        -75.05555556, -74.6, -73.65384615, -72.70769231, -71.76153846,
-        -70.81538462, -69.86923077, -68.92307692, -67.97692308, -67.03076923,
-        -66.08461538, -65.13846154, -64.19230769, -63.2, -62.3,
-        -61.34615385, -60.39230769, -59.43846154, -58.48461538, -57.53076923,
-        -56.57692308, -55.62307692, -54.66923077, -53.71538462, -52.76153846,
-        -51.388, -50.396, -49.9, -48.86666667, -47.83333333, -46.8,
-        -45.76666667, -44.73333333, -43.7, -42.66666667, -41.63333333,
-        -40.6, -39.56666667, -38.944, -37.5, -36.53846154,
-        -35.57692308, -34.61538462, -33.65384615, -32.69230769, -31.73076923
-    ])
-
-    ccd_gain = np.array([
-        35.42917853, 35.47891651, 35.52865449, 35.57163649, 35.61461849,
-        35.6576005, 35.7005825, 35.7435645, 35.7865465, 35.8295285,
-        35.8725105, 35.9154925, 35.95847451, 36.00145651, 36.04443851,
-        36.10811555, 36.13040251, 36.17669082, 36.22297913, 36.26926744,
-        36.31555575, 36.36184406, 36.40813237, 36.45442068, 36.50070899,
-        36.5469973, 36.5932856, 36.63957391, 36.68812019, 36.73215053,
-        36.77881517, 36.82547981, 36.87214444, 36.91880908, 36.96547372,
-        37.01213835, 37.05880299, 37.10546763, 37.15213226, 37.1987969,
-        37.26599398, 37.3145252, 37.33879081, 37.38934417, 37.43989753,
-        37.49045088, 37.54100424, 37.5915576, 37.64211095, 37.69266431,
-        37.74321767, 37.79377102, 37.84432438, 37.87478685, 37.94543109,
-        37.99247206, 38.03951302, 38.08655399, 38.13359495, 38.18063592,
-        38.22767688
-    ])
+    wvlns = _WVLNS_STR if isinstance(wvln, str) else _WVLNS_INT
 
     # --- Index lookup (IDL where) ---
     wvln_loc = wvlns.index(wvln)
-    fw1_loc = fw1_names.index(fw1)
-    fw2_loc = fw2_names.index(fw2)
+    fw1_loc = _FW1_NAMES.index(fw1)
+    fw2_loc = _FW2_NAMES.index(fw2)
 
     # --- Effective area ---
     eff_area = (
-        geom_area *
-        ent_trans[wvln_loc] *
-        fw1_trans[wvln_loc, fw1_loc] *
-        fw2_trans[wvln_loc, fw2_loc] *
-        m1_reflectivity[wvln_loc] *
-        m2_reflectivity[wvln_loc] *
-        ccd_qe_list[wvln_loc]
+        _GEOM_AREA *
+        _ENT_TRANS[wvln_loc] *
+        _FW1_TRANS[wvln_loc, fw1_loc] *
+        _FW2_TRANS[wvln_loc, fw2_loc] *
+        _M1_REFLECTIVITY[wvln_loc] *
+        _M2_REFLECTIVITY[wvln_loc] *
+        _CCD_QE_LIST[wvln_loc]
     )
 
     # --- Gain interpolation ---
-    gain = np.interp(ccd_temp, ccd_gain_temp_array, ccd_gain)
+    gain = np.interp(ccd_temp, _CCD_GAIN_TEMP_ARRAY, _CCD_GAIN)
 
     # --- Response construction (exact IDL order) ---
-    response = gain                               # e-/DN
-    response /= phot_elec_conversion[wvln_loc]    # phot/DN
-    response /= eff_area                          # phot/DN/m^2
-    response *= phot_energy[wvln_loc]             # J/DN/m^2
-    response /= solid_angle                       # J/DN/m^2/sr
+    response = gain                                # e-/DN
+    response /= _PHOT_ELEC_CONVERSION[wvln_loc]    # phot/DN
+    response /= eff_area                           # phot/DN/m^2
+    response *= _PHOT_ENERGY[wvln_loc]             # J/DN/m^2
+    response /= _SOLID_ANGLE                       # J/DN/m^2/sr
 
     return np.array([
         response,
         eff_area,
-        phot_elec_conversion[wvln_loc],
-        phot_energy[wvln_loc],
+        _PHOT_ELEC_CONVERSION[wvln_loc],
+        _PHOT_ENERGY[wvln_loc],
         gain
     ])
 
+
+@lru_cache(maxsize=4096)
+def _cached_response(wvln, fw1, fw2, ccd_temp):
+    response = suvi_approx_response(wvln, fw1, fw2, ccd_temp)
+    response.flags.writeable = False
+    return response
+
+
+def suvi_response_cached(wvln, fw1, fw2, ccd_temp, temp_step=CCD_TEMP_STEP):
+    """
+    Memoised suvi_approx_response, keyed on the quantised CCD temperature.
+
+    Parameters
+    ----------
+    wvln, fw1, fw2, ccd_temp :
+        As for suvi_approx_response.
+    temp_step : float or None, optional
+        CCD temperature quantum in deg C. None caches on the exact value.
+
+    Returns
+    -------
+    response : ndarray, shape (5,)
+        Read-only response vector; copy it before modifying.
+    """
+    ccd_temp = float(ccd_temp)
+    if temp_step:
+        ccd_temp = round(round(ccd_temp / temp_step) * temp_step, 10)
+    return _cached_response(wvln, fw1, fw2, ccd_temp)
+
+
 def _get_index_value(index, key):
     """
     Safely extract metadata from a SuviIndex or dict.
@@ -191,11 +240,86 @@ def _get_index_value(index, key):
     raise KeyError(f"{key} not found in index")
 
 
+def _output_buffer(buf, shape, dtype, name):
+    """
+    Return a caller-supplied output buffer after checking it, or a new one.
+    """
+    if buf is None:
+        return np.empty(shape, dtype=dtype)
+    if buf.shape != tuple(shape):
+        raise ValueError(f"{name} has shape {buf.shape}, expected {tuple(shape)}")
+    if buf.dtype != np.dtype(dtype):
+        raise ValueError(f"{name} has dtype {buf.dtype}, expected {np.dtype(dtype)}")
+    return buf
+
+
+def _output_dtype(dtype, out, err_out, data_dtype):
+    """
+    Output dtype: the requested one, else that of a supplied buffer (out
+    first), else float64 or wider.
+    """
+    if dtype is not None:
+        return dtype
+    for buf in (out, err_out):
+        if buf is not None:
+            return buf.dtype
+    return np.result_type(data_dtype, np.float64)
+
+
+def _restore_block(data, response_factor, dn_per_phot, noise_sq, out, err_out):
+    """
+    Radiance → DN (and optionally DN error) for one block, written in place.
+
+    No full-size temporaries are created: the DN values go straight into
+    ``out`` and the error is built up inside ``err_out``.
+    """
+    # --- Radiance → DN ---
+    np.divide(data, response_factor, out=out, casting="same_kind")
+
+    if err_out is None:
+        return
+
+    # --- Error estimate (IDL-faithful) ---
+    # sqrt(noise^2 + (shot_noise / (gain / q))^2) with
+    # shot_noise^2 = max(DN, 0) * gain / q, i.e. noise^2 + max(DN, 0) * q / gain
+    np.maximum(out, 0.0, out=err_out)
+    err_out *= dn_per_phot
+    err_out += noise_sq
+    np.sqrt(err_out, out=err_out)
+
+
+def _restore_rows(data, response_factor, dn_per_phot, noise_sq, out, err_out,
+                  chunk_rows):
+    """
+    Run _restore_block over row tiles of ``data`` along its second-last axis.
+
+    Only ``chunk_rows`` rows of the input are touched at a time, so a
+    memory-mapped ``data`` is paged in tile by tile.
+    """
+    if chunk_rows is None:
+        _restore_block(data, response_factor, dn_per_phot, noise_sq, out, err_out)
+        return
+
+    ny = data.shape[-2]
+    for r0 in range(0, ny, chunk_rows):
+        rows = slice(r0, min(r0 + chunk_rows, ny))
+        _restore_block(
+            data[..., rows, :], response_factor, dn_per_phot, noise_sq,
+            out[..., rows, :],
+            None if err_out is None else err_out[..., rows, :]
+        )
+
+
+@instrument('restore')
 def suvi_restore_dn(
     data,
     index,
     approx_camera_noise=1.0,
-    return_error=True
+    return_error=True,
+    out=None,
+    err_out=None,
+    dtype=None,
+    chunk_rows=None
 ):
     """
     Restore SUVI L1b radiance image to Data Numbers (DN).
@@ -203,13 +327,25 @@ def suvi_restore_dn(
     Parameters
     ----------
     data : ndarray
-        SUVI L1b image in radiance units (W m^-2 sr^-1)
+        SUVI L1b image in radiance units (W m^-2 sr^-1). May be an
+        np.memmap; with chunk_rows it is read one row tile at a time.
     index : object or dict
         Must contain wavelnth, filter1, filter2, ccd_tmp1
     approx_camera_noise : float, optional
         Camera noise in DN (default = 1 DN, matches IDL)
     return_error : bool, optional
         Whether to return error estimate
+    out : ndarray, optional
+        Preallocated buffer for the DN image, same shape as data
+    err_out : ndarray, optional
+        Preallocated buffer for the error estimate, same shape as data
+    dtype : dtype, optional
+        Output dtype, e.g. np.float32. Defaults to the dtype of out (or
+        err_out) when given, else float64. A supplied out or err_out of
+        another dtype raises ValueError.
+    chunk_rows : int, optional
+        Process the image in tiles of this many rows. Peak memory is then
+        the output buffers plus a tile of input, independent of image size.
 
     Returns
     -------
@@ -232,25 +368,116 @@ def suvi_restore_dn(
     response = suvi_approx_response(wvln, fw1, fw2, ccd_temp)
 
     response_factor = response[0]   # J / DN m^-2 sr^-1
-    phot_energy = response[3]       # J / photon
     ccd_gain = response[4]          # e- / DN
 
-    # --- Radiance → DN ---
-    out_dn = data / response_factor
+    # --- Output buffers ---
+    dtype = _output_dtype(dtype, out, err_out if return_error else None, data.dtype)
+    out_dn = _output_buffer(out, data.shape, dtype, "out")
+    error_estimate = None
+    if return_error:
+        error_estimate = _output_buffer(err_out, data.shape, dtype, "err_out")
+
+    _restore_rows(
+        data, response_factor, response[2] / ccd_gain, approx_camera_noise**2,
+        out_dn, error_estimate, chunk_rows
+    )
 
     if not return_error:
         return out_dn, response
 
-    # --- Error estimate (IDL-faithful) ---
-    # data_phot = out_image * response[4] / response[2]
-    data_phot = out_dn * ccd_gain / response[2]
+    return out_dn, error_estimate, response
 
-    shot_noise = np.sqrt(np.maximum(data_phot, 0.0))
 
-    error_estimate = np.sqrt(
-        approx_camera_noise**2 +
-        (shot_noise / (ccd_gain / response[2]))**2
-    )
+@instrument('restore')
+def suvi_restore_dn_batch(
+    cube,
+    indices,
+    approx_camera_noise=1.0,
+    return_error=True,
+    temp_step=CCD_TEMP_STEP,
+    out=None,
+    err_out=None,
+    dtype=None,
+    chunk_rows=None
+):
+    """
+    Restore a stack of SUVI L1b radiance images to DN in one pass.
 
-    return out_dn, error_estimate, response
+    Parameters
+    ----------
+    cube : ndarray, shape (N, ny, nx)
+        Stack of SUVI L1b images in radiance units (W m^-2 sr^-1)
+    indices : sequence of SuviIndex or dict, length N
+        Per-frame metadata, each with wavelnth, filter1, filter2, ccd_tmp1
+    approx_camera_noise : float, optional
+        Camera noise in DN (default = 1 DN, matches IDL)
+    return_error : bool, optional
+        Whether to return error estimate
+    temp_step : float or None, optional
+        CCD temperature quantum (deg C) used to cache response vectors.
+        None uses the exact temperature of every frame.
+    out, err_out : ndarray, shape (N, ny, nx), optional
+        Preallocated output buffers (may be np.memmap)
+    dtype : dtype, optional
+        Output dtype, e.g. np.float32. Defaults to the dtype of out (or
+        err_out) when given; a supplied buffer of another dtype raises ValueError
+    chunk_rows : int, optional
+        Process each frame in tiles of this many rows instead of the whole
+        cube at once; use with memory-mapped input and output.
+
+    Returns
+    -------
+    out_dn : ndarray, shape (N, ny, nx)
+        Stack converted back to DN
+    error_estimate : ndarray, shape (N, ny, nx) (optional)
+        Approximate DN error per pixel
+    responses : ndarray, shape (N, 5)
+        Response vector of every frame
+    """
+    if not isinstance(cube, np.ndarray):
+        cube = np.asarray(cube)
+    if cube.ndim != 3:
+        raise ValueError("cube must have shape (N, ny, nx)")
+    if len(indices) != cube.shape[0]:
+        raise ValueError(
+            f"Got {len(indices)} indices for {cube.shape[0]} frames"
+        )
+
+    # --- One cached response lookup per frame ---
+    responses = np.empty((cube.shape[0], 5))
+    for i, index in enumerate(indices):
+        responses[i] = suvi_response_cached(
+            _get_index_value(index, "wavelnth"),
+            _get_index_value(index, "filter1"),
+            _get_index_value(index, "filter2"),
+            _get_index_value(index, "ccd_tmp1"),
+            temp_step=temp_step
+        )
+
+    response_factor = responses[:, 0, None, None]
+    # DN per photon: (e- / photon) / (e- / DN)
+    dn_per_phot = (responses[:, 2] / responses[:, 4])[:, None, None]
+    noise_sq = approx_camera_noise**2
+
+    # --- Output buffers ---
+    dtype = _output_dtype(dtype, out, err_out if return_error else None, cube.dtype)
+    out_dn = _output_buffer(out, cube.shape, dtype, "out")
+    error_estimate = None
+    if return_error:
+        error_estimate = _output_buffer(err_out, cube.shape, dtype, "err_out")
+
+    if chunk_rows is None:
+        _restore_block(cube, response_factor, dn_per_phot, noise_sq,
+                       out_dn, error_estimate)
+    else:
+        for i in range(cube.shape[0]):
+            _restore_rows(
+                cube[i], responses[i, 0], dn_per_phot[i, 0, 0], noise_sq,
+                out_dn[i], None if error_estimate is None else error_estimate[i],
+                chunk_rows
+            )
+
+    if not return_error:
+        return out_dn, responses
 
+    return out_dn, error_estimate, responses
@@ -0,0 +1,242 @@
+from dataclasses import dataclass
+from datetime import datetime
+import numbers
+
+import numpy as np
+
+from .suvi_restore_dn import suvi_restore_dn_batch
+from .instrument import instrument
+
+
+@dataclass
+class StackedFrame:
+    start: float      # time of the first stacked frame (s, see _seconds)
+    end: float        # time of the last stacked frame
+    data: np.ndarray  # inverse-variance weighted mean DN
+    error: np.ndarray # propagated 1-sigma error, 1/sqrt(sum of weights)
+    n_frames: int
+
+
+def _seconds(t):
+    """
+    Frame time as seconds: numbers are used as is, datetimes, ISO strings
+    and astropy Times are converted to Unix time.
+    """
+    if isinstance(t, numbers.Real):
+        return float(t)
+    if isinstance(t, datetime):
+        return t.timestamp()
+    from astropy.time import Time
+    return float(Time(t).unix)
+
+
+class _InverseVarianceSums:
+    """
+    Running sum of weights w = 1/err² and of w*DN, with one scratch frame.
+
+    Pixels whose DN is not finite or whose error is not finite and
+    positive get zero weight.
+    """
+
+    def __init__(self, shape, dtype):
+        self.sum_w = np.zeros(shape, dtype=dtype)
+        self.sum_wx = np.zeros(shape, dtype=dtype)
+        self._valid = np.empty(shape, dtype=bool)
+
+    def weights(self, dn, err, w_out, wx_out):
+        np.isfinite(dn, out=self._valid)
+        self._valid &= np.isfinite(err)
+        self._valid &= err > 0
+        w_out.fill(0)
+        np.square(err, out=w_out, where=self._valid)
+        np.reciprocal(w_out, out=w_out, where=self._valid)
+        wx_out.fill(0)
+        np.multiply(w_out, dn, out=wx_out, where=self._valid)
+
+    def result(self, start, end, n_frames):
+        data = np.full(self.sum_w.shape, np.nan, dtype=self.sum_w.dtype)
+        error = np.full(self.sum_w.shape, np.nan, dtype=self.sum_w.dtype)
+        covered = self.sum_w > 0
+        np.divide(self.sum_wx, self.sum_w, out=data, where=covered)
+        np.sqrt(self.sum_w, out=error, where=covered)
+        np.reciprocal(error, out=error, where=covered)
+        return StackedFrame(start, end, data, error, n_frames)
+
+
+class _Stacker:
+
+    def add_batch(self, dn, err, times):
+        """
+        Add a stack of frames, e.g. the (out_dn, error_estimate) of
+        suvi_restore_dn_batch. Returns the list of stacks completed by them.
+        """
+        stacks = []
+        for frame_dn, frame_err, t in zip(dn, err, times):
+            stacks += self.add(frame_dn, frame_err, t)
+        return stacks
+
+    def flush(self):
+        return []
+
+
+class BinnedStacker(_Stacker):
+    """
+    Inverse-variance stacking of (DN, error) frames into fixed time bins.
+
+    Frames are consumed one at a time, in time order. Only the running sums
+    of the current bin and two scratch frames are kept, so memory does not
+    depend on the length of the sequence.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Frame shape (ny, nx).
+    bin_width : float
+        Bin width in seconds.
+    start : time, optional
+        Start of the first bin (number of seconds, datetime, ISO string or
+        astropy Time). Default: the time of the first frame.
+    dtype : dtype, optional
+        Accumulator and output dtype. Default: np.float64
+    """
+
+    def __init__(self, shape, bin_width, start=None, dtype=np.float64):
+        self.bin_width = float(bin_width)
+        self.bin_start = None if start is None else _seconds(start)
+        self._sums = _InverseVarianceSums(shape, dtype)
+        self._w = np.empty(shape, dtype=dtype)
+        self._wx = np.empty(shape, dtype=dtype)
+        self._n = 0
+        self._first = self._last = None
+
+    def _emit(self):
+        stacked = self._sums.result(self._first, self._last, self._n)
+        self._sums.sum_w.fill(0)
+        self._sums.sum_wx.fill(0)
+        self._n = 0
+        return stacked
+
+    def add(self, dn, err, time):
+        """
+        Add one frame. Returns the list of bins completed by it (usually empty).
+        """
+        t = _seconds(time)
+        if self.bin_start is None:
+            self.bin_start = t
+        if self._last is not None and t < self._last:
+            raise ValueError("Frames must be added in time order.")
+
+        done = []
+        if t >= self.bin_start + self.bin_width:
+            if self._n:
+                done.append(self._emit())
+            # Skip empty bins
+            self.bin_start += np.floor((t - self.bin_start) / self.bin_width) * self.bin_width
+
+        self._sums.weights(dn, err, self._w, self._wx)
+        self._sums.sum_w += self._w
+        self._sums.sum_wx += self._wx
+        if self._n == 0:
+            self._first = t
+        self._n += 1
+        self._last = t
+        return done
+
+    def flush(self):
+        """
+        Return the partly filled last bin (or an empty list).
+        """
+        return [self._emit()] if self._n else []
+
+
+class SlidingStacker(_Stacker):
+    """
+    Inverse-variance stacking of (DN, error) frames over a sliding window of frames.
+
+    The weights and weighted DN of the last ``window`` frames are kept in a
+    ring buffer next to their running sums: a new frame replaces the oldest
+    one by subtracting it from the sums and adding the new one, so each
+    frame costs O(pixels) independent of the window. The sums are rebuilt
+    from the ring once per window to stop rounding drift. Memory is
+    2 * window + 4 frames.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Frame shape (ny, nx).
+    window : int
+        Number of frames stacked.
+    step : int, optional
+        Emit a stack every ``step`` frames once the window is full. Default: 1
+    dtype : dtype, optional
+        Accumulator and output dtype. Default: np.float64
+    """
+
+    def __init__(self, shape, window, step=1, dtype=np.float64):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self.step = step
+        self._sums = _InverseVarianceSums(shape, dtype)
+        self._w = np.zeros((window,) + tuple(shape), dtype=dtype)
+        self._wx = np.zeros((window,) + tuple(shape), dtype=dtype)
+        self._times = np.full(window, np.nan)
+        self._count = 0
+
+    def add(self, dn, err, time):
+        """
+        Add one frame. Returns a list with the stack of the current window
+        when one is due, else an empty list.
+        """
+        slot = self._count % self.window
+        sums = self._sums
+        sums.sum_w -= self._w[slot]
+        sums.sum_wx -= self._wx[slot]
+        sums.weights(dn, err, self._w[slot], self._wx[slot])
+        sums.sum_w += self._w[slot]
+        sums.sum_wx += self._wx[slot]
+        self._times[slot] = _seconds(time)
+        self._count += 1
+
+        if self._count % self.window == 0:
+            self._w.sum(axis=0, out=sums.sum_w)
+            self._wx.sum(axis=0, out=sums.sum_wx)
+
+        if self._count < self.window or (self._count - self.window) % self.step:
+            return []
+        return [sums.result(np.nanmin(self._times), np.nanmax(self._times), self.window)]
+
+
+@instrument('stack')
+def stack_restored_batch(cube, indices, times, stacker, frames_per_batch=16, **restore_kwargs):
+    """
+    Restore a stack of SUVI L1b frames to DN and stream them into a stacker.
+
+    cube: (N, ny, nx) radiance stack, e.g. an np.memmap
+    indices: N SuviIndex records (or dicts), as for suvi_restore_dn_batch
+    times: N frame times (seconds, datetimes, ISO strings or astropy Times)
+    stacker: BinnedStacker or SlidingStacker
+    frames_per_batch: Frames restored per suvi_restore_dn_batch call, into
+        buffers reused for every batch; with the stacker, this bounds the
+        memory used. Default: 16
+    restore_kwargs: Passed to suvi_restore_dn_batch (e.g. approx_camera_noise, chunk_rows)
+
+    Returns the list of StackedFrames, including the flushed last bin.
+    """
+    if not isinstance(cube, np.ndarray):
+        cube = np.asarray(cube)
+    batch_shape = (min(frames_per_batch, len(cube)),) + cube.shape[1:]
+    dtype = restore_kwargs.pop('dtype', None) or np.result_type(cube.dtype, np.float64)
+    out = np.empty(batch_shape, dtype=dtype)
+    err_out = np.empty(batch_shape, dtype=dtype)
+
+    stacks = []
+    for i in range(0, len(cube), frames_per_batch):
+        n = min(frames_per_batch, len(cube) - i)
+        dn, err, _ = suvi_restore_dn_batch(
+            cube[i:i + n], indices[i:i + n], return_error=True,
+            out=out[:n], err_out=err_out[:n], **restore_kwargs
+        )
+        stacks += stacker.add_batch(dn, err, times[i:i + n])
+    stacks += stacker.flush()
+    return stacks
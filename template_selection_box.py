@@ -4,13 +4,61 @@
 from matplotlib.widgets import RectangleSelector
 import matplotlib.pyplot as plt
 import astropy.units as u
-from sunpy.map import Map
+from astropy.coordinates import SkyCoord
+from sunpy.map import Map, MapSequence, GenericMap
+import numpy as np
+import json, weakref
+
+PREVIEW_SIZE = 1024 ## Longest side of the preview image, in pixels
+
+# Downsampled previews, dropped together with their map
+_preview_cache = weakref.WeakKeyDictionary()
+
+
+def preview_map(sunpy_map, max_size=PREVIEW_SIZE):
+    """
+    Superpixel (block-mean) version of a map with at most max_size pixels per side.
+
+    Cached per map and size, so reselecting on the same map does not
+    recompute it. Maps already small enough are returned unchanged.
+    """
+    factor = int(np.ceil(max(sunpy_map.data.shape) / max_size))
+    if factor <= 1:
+        return sunpy_map
+    previews = _preview_cache.setdefault(sunpy_map, {})
+    if factor not in previews:
+        previews[factor] = sunpy_map.superpixel([factor, factor] * u.pix, func=np.mean)
+    return previews[factor]
+
+
+def _selection_corners(shown_map, coords):
+    """
+    World corners of a box drawn in pixel coordinates of shown_map.
+    """
+    x1, y1, x2, y2 = coords
+    bottom_left = shown_map.pixel_to_world(min(x1, x2) * u.pix, min(y1, y2) * u.pix)
+    top_right = shown_map.pixel_to_world(max(x1, x2) * u.pix, max(y1, y2) * u.pix)
+    return bottom_left, top_right
+
+
+def select_roi_with_mouse(sunpy_map, cmap=None, norm=None, preview=False, max_preview_size=PREVIEW_SIZE,
+                          roi_file=None):
+    """
+    Select a rectangular region of a map with the mouse and return it as a submap.
+
+    With preview=True a cached superpixel version of the map (see
+    preview_map) is displayed, which keeps the window responsive on
+    4096x4096 frames; the box is mapped back through world coordinates
+    and the submap is cut from the full-resolution map. With roi_file the
+    selection is also written as JSON world coordinates, to be replayed
+    with apply_saved_roi.
+    """
+    shown_map = preview_map(sunpy_map, max_preview_size) if preview else sunpy_map
 
-def select_roi_with_mouse(sunpy_map, cmap=None, norm=None):
     fig = plt.figure()
-    ax = fig.add_subplot(111, projection=sunpy_map)
+    ax = fig.add_subplot(111, projection=shown_map)
     ax.set_title("Select ROI (click and drag) then close the window")
-    sunpy_map.plot(axes=ax)
+    shown_map.plot(axes=ax)
     coords = []
 
     def onselect(eclick, erelease):
@@ -24,11 +72,67 @@ def select_roi_with_mouse(sunpy_map, cmap=None, norm=None):
     if not coords:
         raise RuntimeError("ROI selection cancelled or failed.")
 
-    x1, y1, x2, y2 = coords[0]
-    
-    bottom_left = (min(x1, x2), min(y1, y2)) * u.pix
-    top_right = (max(x1, x2), max(y1, y2)) * u.pix
+    if shown_map is sunpy_map:
+        x1, y1, x2, y2 = coords[0]
+
+        bottom_left = (min(x1, x2), min(y1, y2)) * u.pix
+        top_right = (max(x1, x2), max(y1, y2)) * u.pix
+    else:
+        # Back to full-resolution pixels through world coordinates
+        world_bl, world_tr = _selection_corners(shown_map, coords[0])
+        bottom_left = u.Quantity(sunpy_map.world_to_pixel(world_bl))
+        top_right = u.Quantity(sunpy_map.world_to_pixel(world_tr))
 
     submap = sunpy_map.submap(bottom_left=bottom_left, top_right=top_right)
+    if roi_file is not None:
+        save_roi(roi_file, submap.bottom_left_coord, submap.top_right_coord)
     return submap
 
+
+def save_roi(filename, bottom_left, top_right):
+    """
+    Write ROI corners (SkyCoords) as helioprojective world coordinates to a JSON file.
+    """
+    roi = {
+        'frame': 'helioprojective',
+        'unit': 'arcsec',
+        'bottom_left': [bottom_left.Tx.to_value(u.arcsec), bottom_left.Ty.to_value(u.arcsec)],
+        'top_right': [top_right.Tx.to_value(u.arcsec), top_right.Ty.to_value(u.arcsec)],
+        'obstime': bottom_left.obstime.isot if bottom_left.obstime is not None else None,
+    }
+    with open(filename, 'w') as f:
+        json.dump(roi, f, indent=1)
+
+
+def load_roi(filename, sunpy_map):
+    """
+    Read a saved ROI as (bottom_left, top_right) SkyCoords in the frame of sunpy_map.
+
+    The corners keep their saved Tx/Ty, i.e. a fixed helioprojective box.
+    """
+    with open(filename) as f:
+        roi = json.load(f)
+    unit = u.Unit(roi['unit'])
+    bottom_left = SkyCoord(*roi['bottom_left'] * unit, frame=sunpy_map.coordinate_frame)
+    top_right = SkyCoord(*roi['top_right'] * unit, frame=sunpy_map.coordinate_frame)
+    return bottom_left, top_right
+
+
+def apply_saved_roi(maps, filename):
+    """
+    Cut a saved ROI out of one map or every map of a sequence, without a GUI.
+
+    maps: SunPy Map, MapSequence or list of maps / FITS paths
+    filename: JSON file written by save_roi or select_roi_with_mouse(roi_file=...)
+
+    Returns a submap, or a MapSequence of submaps in input order.
+    """
+    if isinstance(maps, GenericMap):
+        bottom_left, top_right = load_roi(filename, maps)
+        return maps.submap(bottom_left, top_right=top_right)
+    submaps = []
+    for item in maps:
+        smap = item if isinstance(item, GenericMap) else Map(item)
+        bottom_left, top_right = load_roi(filename, smap)
+        submaps.append(smap.submap(bottom_left, top_right=top_right))
+    return MapSequence(submaps, sortby=None)
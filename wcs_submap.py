@@ -4,46 +4,350 @@ from astropy.coordinates import SkyCoord
 from sunpy.map import Map, MapSequence, GenericMap
 from astropy.wcs.utils import skycoord_to_pixel
 from matplotlib.path import Path
+from collections import OrderedDict
+from sunpy.coordinates import HeliographicStonyhurst
 
+try:
+    from sunpy.sun.models import differential_rotation as _differential_rotation
+except ImportError:  # sunpy < 6
+    from sunpy.physics.differential_rotation import diff_rot as _diff_rot
 
-def _mask_submap_region(map_obj, bottom_left, top_right, width=None, height=None, outside_value=-200):
-    # Determine corners
+    def _differential_rotation(duration, latitude, model='howard', frame_time='sidereal'):
+        return _diff_rot(duration, latitude, rot_type=model, frame_time=frame_time)
+
+try:
+    from .instrument import instrument
+except ImportError:  # imported as a top-level module
+    from instrument import instrument
+
+
+_MASK_CACHE_SIZE = 32
+_PIXEL_TOLERANCE = 0.01 ## Pixel polygons that agree to this many pixels share one mask
+_mask_cache = OrderedDict()
+_corner_cache = OrderedDict()
+
+
+def _region_corners(bottom_left, top_right, width, height):
     if top_right is not None:
         br = SkyCoord(top_right.Tx, bottom_left.Ty, frame=bottom_left.frame)
         tl = SkyCoord(bottom_left.Tx, top_right.Ty, frame=bottom_left.frame)
         tr = top_right
     elif width is not None and height is not None:
-        tr = bottom_left + SkyCoord(width, height)
-        br = bottom_left + SkyCoord(width, 0 * height.unit)
-        tl = bottom_left + SkyCoord(0 * width.unit, height)
+        tr = SkyCoord(bottom_left.Tx + width, bottom_left.Ty + height, frame=bottom_left.frame)
+        br = SkyCoord(bottom_left.Tx + width, bottom_left.Ty, frame=bottom_left.frame)
+        tl = SkyCoord(bottom_left.Tx, bottom_left.Ty + height, frame=bottom_left.frame)
     else:
         raise ValueError("Provide either top_right or both width and height.")
 
-    corners = SkyCoord([bottom_left, br, tr, tl, bottom_left], frame=bottom_left.frame)
-    px_x, px_y = skycoord_to_pixel(corners, map_obj.wcs)
-    polygon_xy = np.array([px_x, px_y]).T
+    return SkyCoord([bottom_left, br, tr, tl, bottom_left], frame=bottom_left.frame)
+
+
+def _polygon_mask(polygon_xy, shape):
+    """
+    Rasterize a pixel polygon, testing only the pixels in its bounding box.
+
+    Returns the mask of the bounding box and its (y0, y1, x0, x1) slice
+    bounds in the full image. Pixel centres are tested, as contains_points
+    over the whole image would; a polygon with non-finite corners is empty.
+    """
+    ny, nx = shape
+    if not np.isfinite(polygon_xy).all():
+        # Corners that do not transform (e.g. off-disk seen by another observer)
+        return np.zeros((0, 0), dtype=bool), (0, 0, 0, 0)
+    x0 = max(int(np.ceil(np.nanmin(polygon_xy[:, 0]))), 0)
+    x1 = min(int(np.floor(np.nanmax(polygon_xy[:, 0]))) + 1, nx)
+    y0 = max(int(np.ceil(np.nanmin(polygon_xy[:, 1]))), 0)
+    y1 = min(int(np.floor(np.nanmax(polygon_xy[:, 1]))) + 1, ny)
+    if x1 <= x0 or y1 <= y0:
+        return np.zeros((0, 0), dtype=bool), (0, 0, 0, 0)
+
+    x, y = np.meshgrid(np.arange(x0, x1), np.arange(y0, y1))
+    points = np.column_stack((x.ravel(), y.ravel()))
+    mask = Path(polygon_xy).contains_points(points).reshape((y1 - y0, x1 - x0))
+    return mask, (y0, y1, x0, x1)
+
+
+def _pointing_key(wcs, shape):
+    """
+    Hashable key of the pixel <-> helioprojective mapping of a WCS and an image shape.
+
+    Only CTYPE, CUNIT, CRPIX, CRVAL, CDELT, PC and the native pole enter it,
+    rounded well below a pixel; observer and time keywords (DATE-OBS,
+    DSUN_OBS, HGLT_OBS, ...) do not, and are keyed separately through the
+    coordinate frame where they matter.
+    """
+    w = wcs.wcs
+    return (
+        tuple(w.ctype), tuple(str(unit) for unit in w.cunit),
+        tuple(np.round(w.crpix, 6)), tuple(np.round(w.crval, 9)),
+        tuple(np.round(w.cdelt, 12)), tuple(np.round(w.get_pc().ravel(), 9)),
+        round(float(w.lonpole), 9), round(float(w.latpole), 9),
+        tuple(shape),
+    )
+
+
+def _corners_to_pixel(corners, wcs):
+    """
+    Pixel (x, y) of helioprojective corners from their Tx/Ty alone, with no
+    frame transform; only valid in the frame of the WCS.
+    """
+    return wcs.wcs_world2pix(corners.Tx.to_value(u.deg), corners.Ty.to_value(u.deg), 0)
+
+
+def _frame_key(frame):
+    return repr(frame.replicate_without_data())
+
+
+def _cache_put(cache, key, value):
+    cache[key] = value
+    if len(cache) > _MASK_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def _pixel_corners(corners, map_obj):
+    """
+    Pixel polygon (n, 2) of region corners in a map.
+
+    Corners in the map's own frame are placed by their Tx/Ty with the WCS
+    alone. Corners in another frame (observer or obstime) are converted into
+    the map's frame with skycoord_to_pixel; that result is cached by
+    (pointing, corners, region frame, map frame).
+    """
+    map_frame = map_obj.coordinate_frame
+    if corners.frame.is_equivalent_frame(map_frame):
+        return np.column_stack(_corners_to_pixel(corners, map_obj.wcs))
+
+    key = (
+        _pointing_key(map_obj.wcs, map_obj.data.shape),
+        corners.Tx.to_value(u.arcsec).tobytes(),
+        corners.Ty.to_value(u.arcsec).tobytes(),
+        _frame_key(corners.frame),
+        _frame_key(map_frame),
+    )
+    if key in _corner_cache:
+        _corner_cache.move_to_end(key)
+        return _corner_cache[key]
+    polygon_xy = np.column_stack(skycoord_to_pixel(corners, map_obj.wcs))
+    _cache_put(_corner_cache, key, polygon_xy)
+    return polygon_xy
+
+
+def _polygon_key(polygon_xy, shape):
+    """
+    Hashable key of a pixel polygon, quantised to _PIXEL_TOLERANCE.
+    """
+    quantised = np.round(np.asarray(polygon_xy, dtype=float) / _PIXEL_TOLERANCE)
+    quantised[~np.isfinite(quantised)] = np.iinfo(np.int64).min
+    return tuple(shape), quantised.astype(np.int64).tobytes()
+
 
-    poly = Path(polygon_xy)
+def _region_mask(map_obj, corners):
+    """
+    Bounding-box mask of a region in a map, cached by its pixel polygon and shape.
 
-    ny, nx = map_obj.data.shape
-    x, y = np.meshgrid(np.arange(nx), np.arange(ny))
-    points = np.vstack((x.ravel(), y.ravel())).T
-    mask = poly.contains_points(points).reshape((ny, nx))
+    The corners are converted into the map's frame as skycoord_to_pixel
+    does (see _pixel_corners). Frames with the same pointing, or whose
+    polygons agree to _PIXEL_TOLERANCE, share one read-only mask.
+    """
+    polygon_xy = _pixel_corners(corners, map_obj)
+    key = _polygon_key(polygon_xy, map_obj.data.shape)
+    if key in _mask_cache:
+        _mask_cache.move_to_end(key)
+        return _mask_cache[key]
 
-    # Apply mask
-    padded_data = np.full_like(map_obj.data, outside_value)
-    padded_data[mask] = map_obj.data[mask]
+    mask, bounds = _polygon_mask(polygon_xy, map_obj.data.shape)
+    mask.flags.writeable = False
+    _cache_put(_mask_cache, key, (mask, bounds))
+    return mask, bounds
 
+
+def clear_mask_cache():
+    _mask_cache.clear()
+    _corner_cache.clear()
+
+
+def _apply_region_mask(map_obj, mask, bounds, outside_value=-200, crop=False):
+    """
+    Map with the pixels outside a bounding-box mask set to outside_value,
+    or only the bounding-box cutout with crop.
+    """
+    y0, y1, x0, x1 = bounds
+    box = (slice(y0, y1), slice(x0, x1))
     new_meta = map_obj.meta.copy()
+
+    if crop:
+        if mask.size == 0:
+            raise ValueError("The region does not overlap the map.")
+        padded_data = np.full(mask.shape, outside_value, dtype=map_obj.data.dtype)
+        padded_data[mask] = map_obj.data[box][mask]
+        new_meta['crpix1'] = new_meta['crpix1'] - x0
+        new_meta['crpix2'] = new_meta['crpix2'] - y0
+        new_meta['naxis1'] = x1 - x0
+        new_meta['naxis2'] = y1 - y0
+    else:
+        # Apply mask
+        padded_data = np.full_like(map_obj.data, outside_value)
+        padded_data[box][mask] = map_obj.data[box][mask]
+
     if map_obj.mask is not None:
-        new_mask = np.zeros_like(map_obj.mask)
-        new_mask[mask] = map_obj.mask[mask]
+        new_mask = np.zeros(padded_data.shape, dtype=map_obj.mask.dtype)
+        if crop:
+            new_mask[mask] = map_obj.mask[box][mask]
+        else:
+            new_mask[box][mask] = map_obj.mask[box][mask]
         return Map(padded_data, new_meta, mask=new_mask, plot_settings=map_obj.plot_settings)
 
     return Map(padded_data, new_meta, plot_settings=map_obj.plot_settings)
 
 
-def apply_mask_to_submap(submap, bottom_left, *, top_right=None, width=None, height=None, outside_value=-200):
+def _mask_submap_region(map_obj, bottom_left, top_right, width=None, height=None, outside_value=-200,
+                        crop=False):
+    corners = _region_corners(bottom_left, top_right, width, height)
+    mask, bounds = _region_mask(map_obj, corners)
+    return _apply_region_mask(map_obj, mask, bounds, outside_value, crop)
+
+
+@instrument('mask')
+def apply_mask_to_submap(submap, bottom_left, *, top_right=None, width=None, height=None, outside_value=-200,
+                         crop=False):
+    """
+    Keep the pixels of a map inside a rectangular sky region and set the rest to outside_value.
+
+    The corners are converted into the map's frame as by skycoord_to_pixel. The region mask is
+    rasterized over its pixel bounding box only and cached by its pixel polygon, so frames with
+    the same pointing (or polygons within 0.01 px) reuse it. With crop=True the
+    bounding-box cutout is returned (with adjusted reference pixel) instead of a full frame.
+    """
     if not isinstance(submap, GenericMap):
         raise TypeError("This function expects a single SunPy Map (e.g. a submap).")
-    return _mask_submap_region(submap, bottom_left, top_right, width, height, outside_value)
+    return _mask_submap_region(submap, bottom_left, top_right, width, height, outside_value, crop)
+
+
+class TrackedRegion:
+    """
+    A rectangular sky region that follows solar differential rotation.
+
+    The region is defined at the observation time of bottom_left. Its
+    corners are converted to Heliographic Stonyhurst once; for a batch of
+    frames the synodic rotation of every corner to every frame time, and the
+    projection HGS -> HCC -> HPC for each frame's observer, are evaluated as
+    array expressions over (frames, corners), with no per-frame SkyCoord
+    transforms. Each frame then only needs its WCS to place the polygon in
+    pixels. Corners that rotate behind the limb make the frame's region empty.
+
+    Pixel polygons and masks are cached per (WCS, shape, observer, time),
+    so frames (or repeated passes) sharing a pointing and time reuse them.
+
+    Parameters
+    ----------
+    bottom_left : SkyCoord
+        Bottom-left corner, in the frame (observer and time) of the reference map.
+    top_right : SkyCoord, optional
+        Top-right corner; or give width and height.
+    width, height : Quantity, optional
+        Size of the region in arcsec-like units.
+    model : str, optional
+        Differential-rotation model of sunpy ('howard', 'snodgrass', 'allen', 'rigid').
+    cache_size : int, optional
+        Number of frames whose polygon and mask are cached. Default: 256
+    """
+
+    def __init__(self, bottom_left, *, top_right=None, width=None, height=None, model='howard',
+                 cache_size=256):
+        corners = _region_corners(bottom_left, top_right, width, height)
+        hgs = corners.transform_to(HeliographicStonyhurst(obstime=corners.obstime))
+        self.ref_time = corners.obstime
+        self.model = model
+        self._lon = hgs.lon.to_value(u.rad)
+        self._lat = hgs.lat.to_value(u.deg)
+        self._radius = hgs.radius.to_value(u.m)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def _frame_key(smap):
+        observer = smap.observer_coordinate
+        return (
+            smap.wcs.to_header_string(),
+            smap.data.shape,
+            observer.lon.to_value(u.deg), observer.lat.to_value(u.deg), observer.radius.to_value(u.m),
+            smap.date.isot,
+        )
+
+    def _helioprojective(self, maps):
+        """
+        Tx, Ty (deg) of the rotated corners as (n_frames, n_corners) arrays.
+        """
+        dt = u.Quantity([(smap.date - self.ref_time).to(u.s) for smap in maps])[:, None]
+        observers = [smap.observer_coordinate for smap in maps]
+        L0 = np.array([o.lon.to_value(u.rad) for o in observers])[:, None]
+        B0 = np.array([o.lat.to_value(u.rad) for o in observers])[:, None]
+        D0 = np.array([o.radius.to_value(u.m) for o in observers])[:, None]
+
+        dlon = _differential_rotation(dt, self._lat[None, :] * u.deg, model=self.model,
+                                      frame_time='synodic').to_value(u.rad)
+        lon = self._lon[None, :] + dlon
+        lat = np.deg2rad(self._lat)[None, :]
+        R = self._radius[None, :]
+
+        # Heliographic Stonyhurst -> heliocentric Cartesian (Thompson 2006)
+        x = R * np.cos(lat) * np.sin(lon - L0)
+        y = R * (np.sin(lat) * np.cos(B0) - np.cos(lat) * np.cos(lon - L0) * np.sin(B0))
+        z = R * (np.sin(lat) * np.sin(B0) + np.cos(lat) * np.cos(lon - L0) * np.cos(B0))
+
+        # Heliocentric Cartesian -> helioprojective
+        d = D0 - z
+        Tx = np.rad2deg(np.arctan2(x, d))
+        Ty = np.rad2deg(np.arcsin(y / np.sqrt(x**2 + y**2 + d**2)))
+        behind = z < 0
+        Tx[behind] = np.nan
+        Ty[behind] = np.nan
+        return Tx, Ty
+
+    def masks(self, maps):
+        """
+        Bounding-box mask and (y0, y1, x0, x1) bounds of the region in every map.
+        """
+        maps = list(maps)
+        keys = [self._frame_key(smap) for smap in maps]
+        results = [self._cache.get(key) for key in keys]
+        todo = [i for i, result in enumerate(results) if result is None]
+        if todo:
+            Tx, Ty = self._helioprojective([maps[i] for i in todo])
+            for row, i in enumerate(todo):
+                px_x, px_y = maps[i].wcs.wcs_world2pix(Tx[row], Ty[row], 0)
+                mask, bounds = _polygon_mask(np.column_stack((px_x, px_y)), maps[i].data.shape)
+                mask.flags.writeable = False
+                results[i] = self._cache[keys[i]] = (mask, bounds)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        for key in keys:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+        return results
+
+    @instrument('mask')
+    def apply(self, maps, outside_value=-200, crop=False):
+        """
+        The tracked region in every map, as apply_mask_to_submap would give it.
+
+        Returns a MapSequence of full frames with the outside set to
+        outside_value, or of bounding-box cutouts with crop=True. With crop,
+        frames where the region is not visible are skipped.
+        """
+        maps = list(maps)
+        out = []
+        for smap, (mask, bounds) in zip(maps, self.masks(maps)):
+            if crop and mask.size == 0:
+                continue
+            out.append(_apply_region_mask(smap, mask, bounds, outside_value, crop))
+        return MapSequence(out, sortby=None)
+
+
+def track_region(maps, bottom_left, *, top_right=None, width=None, height=None, outside_value=-200,
+                 crop=False, model='howard'):
+    """
+    Follow a region defined at the time of bottom_left through a sequence; see TrackedRegion.
+    """
+    region = TrackedRegion(bottom_left, top_right=top_right, width=width, height=height, model=model)
+    return region.apply(maps, outside_value=outside_value, crop=crop)